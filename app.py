@@ -1,109 +1,145 @@
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import dash
 from dash import dcc, html, ctx
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import dash_bootstrap_components as dbc
 from datetime import timedelta
-import unicodedata
+from functools import lru_cache
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlencode
+import flask
+
+from cache import CacheMemoria, chave, criar_cache
+from dados import RECARGA_S, Recarregador, padroes_padrao, preparar_operador
+from exportacao import CONTEUDOS, FORMATOS, exportar
+from ingestao import descategorizar
+from metricas import (ATIVAS, CALLBACK_BYTES, CALLBACK_FUNCAO_SEGUNDOS, CALLBACK_SEGUNDOS, PERFIL_LENTO_MS, Amostrador,
+                      cronometrado, gravar_perfil, persistir, tempo_funcao, texto_prometheus)
+from segmentos import (GAP_MAX_MIN, filtrar_janela, improdutivas_janela, indicadores_janela, nivel_de_detalhe, para_us,
+                       tem_improdutivas)
+
+log = logging.getLogger(__name__)
 
 # ===================== PARÂMETROS =====================
 ARQUIVO = "Linha do tempo.xlsx"
 SHEET   = "Plan1"
+# Modo cliente: cards e resumo por máquina calculados no navegador (assets/linha_tempo.js);
+# só a tabela de improdutivas vai ao servidor, com debounce do pan/zoom.
+MODO_CLIENTE = os.environ.get("TIMELINE_MODO_CLIENTE", "0") == "1"
+# Nível de detalhe: acima de N segmentos, o que tiver < 1 pixel vira barra agrupada
+LIMITE_SEGMENTOS_LOD = 1500
+LARGURA_GRAFICO_PX   = 1200
+
+CORES_TIPO = {
+    "Efetivo": "#046414", "Parada Gerenciável": "#FF9393", "Parada Mecânica": "#A52657",
+    "Parada Improdutiva": "#FF0000", "Parada Essencial": "#0026FF",
+    "Deslocamento": "#ffee00", "Manobra": "#93c9f7",
+    "Outros": "#8C8C8C", "Outro": "#222"
+}
+HOVER_TEMPLATE = (
+    "Operador: %{customdata[0]}<br>"
+    "Equipamento: %{customdata[1]}<br>"
+    "Tipo: %{customdata[2]}<br>"
+    "Operação: %{customdata[3]}<br>"
+    "Início: %{customdata[4]}<br>"
+    "Fim: %{customdata[5]}<br>"
+    "Duração: %{customdata[6]:.1f} min"
+)
 
 # ===================== CARGA & LIMPEZA =====================
-df = pd.read_excel(ARQUIVO, sheet_name=SHEET)
-
-# Equipamento (string amigável)
-df["Equipamento"] = df["Código Equipamento"].astype(str) + " - " + df["Descrição do Equipamento"]
-
-# Parsing
-df["Hora Inicial"]    = pd.to_datetime(df["Hora Inicial"], format="%H:%M:%S", errors="coerce").dt.time
-df["Hora Final"]      = pd.to_datetime(df["Hora Final"],   format="%H:%M:%S", errors="coerce").dt.time
-df["Data Hora Local"] = pd.to_datetime(df["Data Hora Local"], dayfirst=True, errors="coerce")
-df = df.dropna(subset=["Nome", "Hora Inicial", "Hora Final", "Data Hora Local"]).copy()
-
-# Instantes absolutos
-df["Inicio"] = df.apply(lambda r: pd.to_datetime(f"{r['Data Hora Local'].date()} {r['Hora Inicial']}"), axis=1)
-df["Fim"]    = df.apply(lambda r: pd.to_datetime(f"{r['Data Hora Local'].date()} {r['Hora Final']}"), axis=1)
-
-# Cruza meia-noite? soma 1 dia no Fim
-mask_cross = df["Fim"] < df["Inicio"]
-df.loc[mask_cross, "Fim"] = df.loc[mask_cross, "Fim"] + pd.Timedelta(days=1)
-
-# ===================== CLASSIFICAÇÃO =====================
-def classifica_tipo_parada(row):
-    grupo = str(row["Descrição do Grupo da Operação"]).strip().upper()
-    desc  = str(row["Descrição da Operação"]).strip().upper()
-    gerenciaveis = {"AGUARDANDO COMBUSTIVEL","AGUARDANDO ORDENS","AGUARDANDO MOVIMENTACAO PIVO","FALTA DE INSUMOS"}
-    essenciais   = {"REFEICAO","BANHEIRO"}
-    mecanicas    = {"AGUARDANDO MECANICO","BORRACHARIA","EXCESSO DE TEMPERATURA DO MOTOR","IMPLEMENTO QUEBRADO",
-                    "MANUTENCAO ELETRICA","MANUTENCAO MECANICA","TRATOR QUEBRADO","SEM SINAL GPS"}
-    if grupo == "PRODUTIVA":  return "Efetivo"
-    if grupo == "IMPRODUTIVA":
-        if desc in gerenciaveis: return "Parada Gerenciável"
-        if desc in mecanicas:    return "Parada Mecânica"
-        if desc in essenciais:   return "Parada Essencial"
-        if desc == "OUTROS":     return "Outros"
-        return "Parada Improdutiva"
-    if desc == "DESLOCAMENTO":  return "Deslocamento"
-    if desc == "MANOBRA":       return "Manobra"
-    return "Outro"
-
-df["Tipo Parada"] = df.apply(classifica_tipo_parada, axis=1)
+# Snapshot em disco: só relê o xlsx quando ele muda (ver ingestao.carregar_base).
+# Agrupado de todos os operadores uma vez só (trocar de operador não re-agrupa).
+# Fontes: ARQUIVO + TIMELINE_PASTA_EXPORTS + TIMELINE_FONTES (globs de xlsx/abas/csv,
+# lidos em paralelo e sem registros repetidos entre arquivos). Vigiadas em segundo
+# plano: quando mudam, a nova versão é montada fora das requisições e trocada inteira.
+# Com TIMELINE_BUFFERS (gunicorn.conf.py), a base fica em buffers Arrow mapeados
+# em memória, montados uma vez e compartilhados por todos os workers.
+recarregador = Recarregador(padroes_padrao(ARQUIVO), SHEET, GAP_MAX_MIN)
+
+def base():
+    """Versão atual da base (df, segmentos, versao); pegue uma vez por callback."""
+    return recarregador.atual
+
+# ===================== CACHE POR OPERADOR =====================
+# O Store do navegador guarda só a chave (versão, operador); o agrupado
+# (com datetimes já prontos) fica no servidor. Ver TIMELINE_CACHE em cache.py.
+cache_prep = criar_cache()
+PREP_VAZIO = {"dff": pd.DataFrame(columns=base().segmentos.columns), "tmin": None, "tmax": None, "equip_all": []}
+
+def montar_prep(dados, operador):
+    return preparar_operador(dados, operador) or PREP_VAZIO
+
+def obter_prep(store):
+    """Agrupado do operador a partir da chave do Store (recalcula em caso de miss)."""
+    if not store or store.get("operador") is None:
+        return PREP_VAZIO
+    k = chave("prep", store.get("versao"), store["operador"])
+    prep = cache_prep.get(k)
+    if prep is None:
+        dados = base()
+        prep = montar_prep(dados, store["operador"])
+        # Store de uma versão que já saiu: serve a atual sem gravar na chave velha
+        # (o intervalo de versão atualiza o Store logo em seguida)
+        if dados.versao == store.get("versao"):
+            cache_prep.set(k, prep)
+    return prep
 
 # ===================== UTILIDADES =====================
-def normalize_ascii_upper(s: str) -> str:
-    return unicodedata.normalize("NFKD", str(s)).encode("ASCII","ignore").decode("ASCII").upper()
-
-def eh_fim_de_expediente(txt: str) -> bool:
-    t = normalize_ascii_upper(txt)
-    return ("EXPEDIENTE" in t) and (("FIM" in t) or ("FINAL" in t))
-
-def agrupar_paradas(df_filtrado):
+@lru_cache(maxsize=64)
+def divisores_de_dia(tmin, tmax):
+    """
+    Linhas + rótulos "Dia dd/mm" de tmin.date() até tmax.date()+1, como dicts prontos.
+    Calculado uma vez por (tmin, tmax); não alterar o retorno (é compartilhado).
     """
-    Colapsa blocos contíguos da MESMA operação, MESMO equipamento e MESMO operador (gap <= 2min).
-    Retorna: Nome, Inicio, Fim, Descrição da Operação, Duracao Min, Tipo Parada, Equipamento.
+    dias = pd.date_range(tmin.normalize(), tmax.normalize() + pd.Timedelta(days=1), freq="D")
+    meios = dias + pd.Timedelta(hours=12)
+    shapes = tuple(
+        {"type": "line", "xref": "x", "x0": d, "x1": d, "yref": "y domain", "y0": 0, "y1": 1,
+         "line": {"width": 1, "dash": "dot", "color": "#9aa0a6"}}
+        for d in dias.strftime("%Y-%m-%d %H:%M:%S"))
+    annotations = tuple(
+        {"x": m, "y": 1.08, "yref": "paper", "text": t, "showarrow": False,
+         "font": {"size": 11, "color": "#e0e0e0"}}
+        for m, t in zip(meios.strftime("%Y-%m-%d %H:%M:%S"), dias.strftime("Dia %d/%m")))
+    return dias, shapes, annotations
+
+def add_divisores_de_dia(fig, tmin, tmax, janela=None):
+    """
+    Aplica os divisores de dia numa atribuição só de layout (em vez de add_vline/
+    add_annotation por dia). janela=(x0, x1) limita aos dias que cruzam a janela.
     """
-    if df_filtrado.empty:
-        return pd.DataFrame(columns=["Nome","Inicio","Fim","Descrição da Operação","Duracao Min","Tipo Parada","Equipamento"])
-    d = df_filtrado.sort_values("Inicio").reset_index(drop=True)
-    out = []; i = 0
-    while i < len(d):
-        a = d.loc[i]
-        ini, fim = a["Inicio"], a["Fim"]
-        op, nome, tipo, equip = a["Descrição da Operação"], a["Nome"], a["Tipo Parada"], a["Equipamento"]
-        j = i + 1
-        while j < len(d):
-            p = d.loc[j]
-            gap = (p["Inicio"] - fim).total_seconds()/60.0
-            if (p["Descrição da Operação"] == op) and (p["Equipamento"] == equip) and (p["Nome"] == nome) and gap <= 2:
-                fim = max(fim, p["Fim"]); j += 1
-            else:
-                break
-        out.append({
-            "Nome": nome, "Inicio": ini, "Fim": fim,
-            "Descrição da Operação": op,
-            "Duracao Min": max(0.0,(fim-ini).total_seconds()/60.0),
-            "Tipo Parada": tipo,
-            "Equipamento": equip
-        })
-        i = j
-    return pd.DataFrame(out)
-
-def add_divisores_de_dia(fig, tmin, tmax):
     if tmin is None or tmax is None: return
-    tmin = pd.to_datetime(tmin); tmax = pd.to_datetime(tmax)
-    start_day = pd.to_datetime(tmin.date())
-    end_day   = pd.to_datetime(tmax.date()) + pd.Timedelta(days=1)
-    cur = start_day
-    while cur <= end_day:
-        fig.add_vline(x=cur, line_width=1, line_dash="dot", line_color="#9aa0a6")
-        mid = cur + pd.Timedelta(hours=12)
-        fig.add_annotation(x=mid, y=1.08, yref="paper",
-                           text=cur.strftime("Dia %d/%m"),
-                           showarrow=False, font=dict(size=11, color="#e0e0e0"))
-        cur += pd.Timedelta(days=1)
+    dias, shapes, annotations = divisores_de_dia(pd.Timestamp(tmin), pd.Timestamp(tmax))
+    if janela is not None:
+        x0, x1 = pd.Timestamp(janela[0]), pd.Timestamp(janela[1])
+        idx = ((dias + pd.Timedelta(days=1) > x0) & (dias < x1)).nonzero()[0]
+        shapes = [shapes[i] for i in idx]; annotations = [annotations[i] for i in idx]
+    fig.update_layout(shapes=list(fig.layout.shapes) + list(shapes),
+                      annotations=list(fig.layout.annotations) + list(annotations))
+
+def janela_do_relayout(relayoutData, periodo):
+    """(x0, x1) só quando o relayout traz o eixo x (autorange → período completo); senão None."""
+    rd = relayoutData or {}
+    if rd.get("xaxis.autorange", False):
+        return periodo
+    if any(k.startswith("xaxis.range") for k in rd):
+        return janela_visivel(None, rd)
+    return None
+
+def precisa_redesenhar(lod, x0, x1):
+    """Janela saiu da região detalhada (janela desenhada ± 1 largura) ou o zoom mudou > 2x."""
+    a, b = pd.to_datetime(lod["x0"]), pd.to_datetime(lod["x1"])
+    larg = b - a
+    if x0 < a - larg or x1 > b + larg:
+        return True
+    razao = (x1 - x0) / larg if larg > pd.Timedelta(0) else 0
+    return not (0.5 <= razao <= 2)
 
 def janela_inicial_do_dia(data_str):
     base_day = pd.to_datetime(data_str).normalize()
@@ -134,100 +170,286 @@ def janela_visivel(data_str, relayoutData, tmin_fallback=None):
         return pd.to_datetime(rd["xaxis.rangeslider.range[0]"]), pd.to_datetime(rd["xaxis.rangeslider.range[1]"])
     return x0, x1
 
+# ===================== JANELA VISÍVEL =====================
+# Resultado da consulta por (versão, operador, janela): os três callbacks da
+# janela disparam juntos a cada zoom/pan e reaproveitam a mesma consulta.
+cache_janela = CacheMemoria(max_itens=256, max_mb=64)
+
+def janela_atual(prep, data_str, relayoutData):
+    # Janela atual: se não houver relayout, usa período completo
+    if relayoutData is None and prep.get("tmin") and prep.get("tmax"):
+        x0 = pd.to_datetime(prep["tmin"]).normalize()
+        x1 = pd.to_datetime(prep["tmax"]).normalize() + pd.Timedelta(days=1)
+        return x0, x1
+    return janela_visivel(data_str, relayoutData, prep.get("tmin"))
+
+def consultar_janela(store, prep, data_str, relayoutData, equips_sel):
+    """
+    Totais por (Equipamento, Tipo Parada, Operação) recortados na janela visível
+    (IndiceJanela do operador), filtrados pelas máquinas selecionadas (padrão = todas).
+    """
+    x0, x1 = janela_atual(prep, data_str, relayoutData)
+    k = chave("janela", store.get("versao"), store.get("operador"), x0.isoformat(), x1.isoformat())
+    win = cache_janela.get(k)
+    if win is None:
+        win = prep["indice"].consulta(x0, x1)
+        cache_janela.set(k, win)
+    return filtrar_janela(win, equips_sel or prep.get("equip_all", []))
+
+# ===================== FROTA =====================
+# Todos os operadores (ou equipamentos) lado a lado, a partir do resumo diário
+# montado na carga (dados.diario, ver resumo_diario): abrir/filtrar a visão só
+# recorta e pivota essa tabela, não passa pelos segmentos.
+DIMENSOES_FROTA = {"Nome": "Operador", "Equipamento": "Equipamento"}
+LIMITE_RANKING    = 30   # barras no ranking
+DIAS_FROTA_PADRAO = 31   # período inicial: últimos N dias com dados
+
+def dias_resumo(dados):
+    """(primeiro, último) dia com horas no resumo, ou (None, None)."""
+    dia = dados.diario["Nome"]["Dia"]
+    return (dia.min().date(), dia.max().date()) if len(dia) else (None, None)
+
+def tipos_ordenados(tipos):
+    """Na ordem das cores (Efetivo primeiro); tipos fora de CORES_TIPO no fim."""
+    tipos = set(tipos)
+    return [t for t in CORES_TIPO if t in tipos] + sorted(tipos - set(CORES_TIPO))
+
+def tipos_frota(dados):
+    return tipos_ordenados(dados.diario["Nome"]["Tipo Parada"].dropna().unique())
+
+def recorte_frota(dados, dimensao, dia_ini, dia_fim):
+    """Linhas do resumo no período [dia_ini, dia_fim] (dias inteiros), já como texto."""
+    r = dados.diario[dimensao]
+    if dia_ini:
+        r = r[r["Dia"] >= pd.Timestamp(dia_ini).normalize()]
+    if dia_fim:
+        r = r[r["Dia"] <= pd.Timestamp(dia_fim).normalize()]
+    return descategorizar(r)
+
+def totais_frota(r, dimensao, tipo):
+    """Horas no período por entidade × tipo, ordenado pelas horas do tipo escolhido (maior 1º)."""
+    tot = r.pivot_table(index=dimensao, columns="Tipo Parada", values="Horas", aggfunc="sum", fill_value=0.0)
+    chave = tot[tipo] if tipo in tot else pd.Series(0.0, index=tot.index)
+    return tot.loc[chave.sort_values(ascending=False, kind="stable").index]
+
+def fig_vazia_frota(titulo):
+    fig = go.Figure()
+    fig.update_layout(title=titulo, xaxis=dict(visible=False), yaxis=dict(visible=False), height=300)
+    return fig
+
+def fig_mapa_frota(r, tot, dimensao, tipo):
+    """Heatmap entidade × dia das horas do tipo; linhas na ordem do ranking, dia sem horas = 0."""
+    t = r[r["Tipo Parada"] == tipo]
+    dias = pd.date_range(r["Dia"].min(), r["Dia"].max(), freq="D")
+    mapa = (t.pivot(index=dimensao, columns="Dia", values="Horas")
+             .reindex(index=tot.index, columns=dias).fillna(0.0))
+    rotulo = DIMENSOES_FROTA[dimensao]
+    fig = go.Figure(go.Heatmap(
+        z=mapa.to_numpy().round(2), x=dias, y=list(mapa.index),
+        colorscale=[[0, "#ffffff"], [1, CORES_TIPO.get(tipo, "#222")]], colorbar=dict(title="h"),
+        hovertemplate=f"{rotulo}: %{{y}}<br>Dia: %{{x|%d/%m/%Y}}<br>{tipo}: %{{z:.2f}} h<extra></extra>",
+    ))
+    fig.update_layout(title=f"<b>{tipo}</b> — horas por {rotulo.lower()} e dia",
+                      height=max(300, 18 * len(mapa) + 150), yaxis=dict(autorange="reversed"),
+                      margin=dict(l=10, r=10, t=60, b=40))
+    return fig
+
+def fig_ranking_frota(tot, dimensao, tipo):
+    """Barras empilhadas por tipo dos LIMITE_RANKING primeiros; o tipo escolhido vem à esquerda."""
+    top = tot.head(LIMITE_RANKING)
+    tipos = ([tipo] if tipo in top else []) + [t for t in tipos_ordenados(top.columns) if t != tipo]
+    fig = go.Figure([go.Bar(x=top[t].round(2), y=list(top.index), orientation="h", name=t,
+                            marker_color=CORES_TIPO.get(t, "#222"),
+                            hovertemplate=f"%{{y}}<br>{t}: %{{x:.2f}} h<extra></extra>")
+                     for t in tipos])
+    rotulo = DIMENSOES_FROTA[dimensao]
+    fig.update_layout(barmode="stack", title=f"<b>Ranking</b> — {rotulo.lower()}s por horas de {tipo} no período",
+                      height=max(300, 22 * len(top) + 150), yaxis=dict(autorange="reversed"),
+                      xaxis=dict(title="Horas"), legend=dict(orientation="h", y=-0.15),
+                      margin=dict(l=10, r=10, t=60, b=40))
+    return fig
+
+def layout_frota(dados):
+    d0, d1 = dias_resumo(dados)
+    tipos = tipos_frota(dados)
+    return [
+        dbc.Card(dbc.CardBody(dbc.Row([
+            dbc.Col(dbc.RadioItems(
+                id="frota-dimensao", inline=True, value="Nome",
+                options=[{"label": v, "value": k} for k, v in DIMENSOES_FROTA.items()],
+            ), md=3),
+            dbc.Col(dcc.Dropdown(
+                id="frota-tipo", options=tipos, clearable=False,
+                value="Efetivo" if "Efetivo" in tipos else (tipos[0] if tipos else None),
+            ), md=4),
+            dbc.Col(dcc.DatePickerRange(
+                id="frota-periodo", display_format="DD/MM/YYYY",
+                min_date_allowed=d0, max_date_allowed=d1, end_date=d1,
+                start_date=max(d0, d1 - timedelta(days=DIAS_FROTA_PADRAO - 1)) if d1 else None,
+            ), md=4),
+            dbc.Col(menu_exportacao("frota-exportar"), width="auto", className="ms-auto"),
+        ], align="center")), className="mb-3"),
+        dbc.Card(dbc.CardBody(dcc.Graph(id="frota-ranking")), className="mb-3"),
+        dbc.Card(dbc.CardBody(dcc.Graph(id="frota-mapa"))),
+    ]
+
+# ===================== EXPORTAÇÃO =====================
+# Links de download (rota /exportar no Flask, ver exportacao.py): o arquivo sai
+# em pedaços direto do servidor; dcc.Download passaria o arquivo inteiro pelo
+# callback (base64 na memória do worker e do navegador).
+ITENS_EXPORTACAO = [(c, f) for c in CONTEUDOS for f in FORMATOS]
+
+def menu_exportacao(prefixo):
+    return dbc.DropdownMenu(label="Exportar", size="sm", color="secondary", align_end=True, children=[
+        dbc.DropdownMenuItem(f"{CONTEUDOS[c]} ({f.upper()})", id=f"{prefixo}-{c}-{f}", href="#", external_link=True)
+        for c, f in ITENS_EXPORTACAO])
+
+def url_exportacao(conteudo, formato, x0, x1, operador=None, equips=None):
+    q = [("inicio", pd.Timestamp(x0).isoformat()), ("fim", pd.Timestamp(x1).isoformat())]
+    q += [("operador", operador)] if operador else []
+    q += [("equip", e) for e in equips or []]
+    return app.get_relative_path(f"/exportar/{conteudo}.{formato}") + "?" + urlencode(q)
+
+def nome_exportacao(conteudo, formato, x0, x1, operador):
+    nome = f"{conteudo}_{operador or 'todos'}_{x0:%Y%m%d-%H%M}_{x1:%Y%m%d-%H%M}"
+    return re.sub(r"[^\w.-]+", "_", nome) + "." + formato
+
 # ===================== APP =====================
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME])
 app.title = "Linha do Tempo Operacional"
+server = app.server   # gunicorn app:server
+
+# Vigia das fontes: sobe na 1ª requisição de cada processo que atende (nunca no
+# import — com preload, quem importa é o master do gunicorn, que não atende)
+@server.before_request
+def iniciar_recarga():
+    recarregador.iniciar()
 
 # Valores iniciais (só para preencher os dropdowns)
-primeiro_nome = sorted(df["Nome"].dropna().unique())[0]
-primeiras_datas = sorted(df[df["Nome"] == primeiro_nome]["Data Hora Local"].dt.date.unique())
+dados_iniciais = base()
+nomes_iniciais = dados_iniciais.nomes
+primeiro_nome = nomes_iniciais[0]
+primeiras_datas = dados_iniciais.operadores[primeiro_nome]["datas"]
 data_padrao = str(primeiras_datas[-1]) if len(primeiras_datas) else None
 
 app.layout = html.Div(style={"backgroundColor": "#f8f9fa", "padding": "20px"}, children=[
     dbc.Container([
         html.H1("Linha do Tempo dos Operadores", className="text-center mb-4", style={"color": "#343a40", "fontWeight": "bold"}),
 
-        # Filtros
-        dbc.Card(dbc.CardBody([
-            dbc.Row([
-                dbc.Col(dcc.Dropdown(
-                    id="operador-dropdown",
-                    options=[{"label": n, "value": n} for n in sorted(df["Nome"].dropna().unique())],
-                    value=primeiro_nome,
-                    placeholder="Selecione um Operador"
-                ), md=6),
-                dbc.Col(dcc.Dropdown(
-                    id="data-dropdown",
-                    options=[{"label": str(d), "value": str(d)} for d in primeiras_datas],
-                    value=data_padrao,
-                    placeholder="Selecione um dia para focar (zoom)"
-                ), md=6),
-            ], align="center"),
-
-            html.Hr(),
-            html.H5("Máquinas (equipamentos) do operador — desligue para ocultar do gráfico/tabela"),
-            dbc.Row([
-                dbc.Col(dcc.Dropdown(
-                    id="equipamentos-checklist",
-                    options=[], value=[], multi=True,
-                    placeholder="Todas as máquinas (padrão)"
-                ), md=8),
-                dbc.Col(html.Div(id="resumo-maquinas-div"), md=4)
-            ], align="center"),
-        ]), className="mb-3"),
-
-        dbc.Card(dbc.CardBody(id="stats-div"), className="mb-3"),
-        dbc.Card(dbc.CardBody(dcc.Graph(id="grafico-linha-tempo", style={"height": "600px"}))),
-
-        # cache leve do operador
+        dbc.Tabs(id="abas", active_tab="aba-operador", className="mb-3", children=[
+            dbc.Tab(label="Operador", tab_id="aba-operador", children=[
+                # Filtros
+                dbc.Card(dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col(dcc.Dropdown(
+                            id="operador-dropdown",
+                            options=[{"label": n, "value": n} for n in nomes_iniciais],
+                            value=primeiro_nome,
+                            placeholder="Selecione um Operador"
+                        ), md=6),
+                        dbc.Col(dcc.Dropdown(
+                            id="data-dropdown",
+                            options=[{"label": str(d), "value": str(d)} for d in primeiras_datas],
+                            value=data_padrao,
+                            placeholder="Selecione um dia para focar (zoom)"
+                        ), md=6),
+                    ], align="center"),
+
+                    html.Hr(),
+                    html.H5("Máquinas (equipamentos) do operador — desligue para ocultar do gráfico/tabela"),
+                    dbc.Row([
+                        dbc.Col(dcc.Dropdown(
+                            id="equipamentos-checklist",
+                            options=[], value=[], multi=True,
+                            placeholder="Todas as máquinas (padrão)"
+                        ), md=8),
+                        dbc.Col(html.Div(id="resumo-maquinas-div"), md=4)
+                    ], align="center"),
+                ]), className="mb-3"),
+
+                dbc.Card(dbc.CardBody(id="stats-div"), className="mb-3"),
+                dbc.Card(dbc.CardBody(dcc.Graph(id="grafico-linha-tempo", style={"height": "600px"}))),
+
+                # Tabela
+                html.Br(),
+                dbc.Card(dbc.CardBody([
+                    dbc.Row([
+                        dbc.Col(html.H4("Paradas improdutivas — operador & janela visível", className="mb-3")),
+                        dbc.Col(menu_exportacao("exportar"), width="auto"),
+                    ]),
+                    html.Div(id="tabela-improdutivas")
+                ]), className="mt-2"),
+            ]),
+            dbc.Tab(label="Frota", tab_id="aba-frota", children=layout_frota(dados_iniciais)),
+        ]),
+
+        # chave do cache do operador (os dados ficam no servidor)
         dcc.Store(id="store-prep"),
-
-        # Tabela
-        html.Br(),
-        dbc.Card(dbc.CardBody([
-            html.H4("Paradas improdutivas — operador & janela visível", className="mb-3"),
-            html.Div(id="tabela-improdutivas")
-        ]), className="mt-2"),
+        # versão da base em uso; o intervalo confere se o servidor trocou de versão
+        dcc.Store(id="store-versao", data=base().versao),
+        dcc.Interval(id="intervalo-versao", interval=max(RECARGA_S, 1) * 1000, disabled=RECARGA_S <= 0),
+        # janela/estado do nível de detalhe desenhado; relayout que pede redesenho
+        dcc.Store(id="store-lod"),
+        dcc.Store(id="relayout-lod"),
+        # período e rotas para os links de exportação do operador (montados no navegador)
+        dcc.Store(id="store-exportacao"),
+        # modo cliente: segmentos compactos do operador + relayout com debounce
+        *([dcc.Store(id="store-segmentos"), dcc.Store(id="relayout-debounce")] if MODO_CLIENTE else []),
     ], fluid=False)
 ])
 
+# Base recarregada no servidor? Só então o resto da página é atualizado
+@app.callback(
+    Output("store-versao", "data"),
+    Input("intervalo-versao", "n_intervals"),
+    State("store-versao", "data"),
+)
+@cronometrado
+def conferir_versao(_, versao):
+    atual = base().versao
+    return atual if atual != versao else dash.no_update
+
+@app.callback(
+    Output("operador-dropdown", "options"),
+    Input("store-versao", "data"),
+)
+@cronometrado
+def atualizar_operadores(_):
+    return [{"label": n, "value": n} for n in base().nomes]
+
 # Atualiza a lista de datas por operador (apenas para o seletor de zoom)
 @app.callback(
     Output("data-dropdown", "options"),
     Output("data-dropdown", "value"),
     Input("operador-dropdown", "value"),
+    Input("store-versao", "data"),
+    State("data-dropdown", "value"),
 )
-def atualizar_datas(operador):
-    datas = sorted(df[df["Nome"] == operador]["Data Hora Local"].dt.date.unique())
+@cronometrado
+def atualizar_datas(operador, _, data_atual):
+    part = base().operadores.get(operador)
+    datas = part["datas"] if part else []
     opts = [{"label": str(d), "value": str(d)} for d in datas]
+    # base nova com o mesmo operador: mantém o dia escolhido (não mexe no zoom)
+    if ctx.triggered_id == "store-versao" and data_atual in {o["value"] for o in opts}:
+        return opts, dash.no_update
     val = str(datas[-1]) if len(datas) else None
     return opts, val
 
-# Prepara e guarda no Store o agrupado COMPLETO do operador + máquinas usadas
+# Prepara o agrupado COMPLETO do operador no cache do servidor; o Store leva só a chave
+# (versão, operador) — base nova → chave nova → figura/cards refeitos com a versão nova
 @app.callback(
     Output("store-prep", "data"),
     Input("operador-dropdown", "value"),
+    Input("store-versao", "data"),
 )
-def preparar_dados(operador):
-    base = df[df["Nome"] == operador].copy()
-    if base.empty:
-        return {"dff": [], "tmin": None, "tmax": None, "equip_all": []}
-
-    dff = agrupar_paradas(base)
-    dff = dff[~dff["Descrição da Operação"].map(eh_fim_de_expediente)]  # limpa "fim/final de expediente"
-
-    tmin = dff["Inicio"].min()
-    tmax = dff["Fim"].max()
-    equip_all = sorted(dff["Equipamento"].dropna().unique().tolist())
-
-    # serializa para Store
-    dff_json = dff.assign(Inicio=dff["Inicio"].astype(str), Fim=dff["Fim"].astype(str)).to_dict("records")
-    return {
-        "dff": dff_json,
-        "tmin": str(tmin) if pd.notnull(tmin) else None,
-        "tmax": str(tmax) if pd.notnull(tmax) else None,
-        "equip_all": equip_all
-    }
+@cronometrado
+def preparar_dados(operador, _):
+    dados = base()
+    k = chave("prep", dados.versao, operador)
+    if cache_prep.get(k) is None:
+        cache_prep.set(k, montar_prep(dados, operador))
+    return {"versao": dados.versao, "operador": operador}
 
 # Filtro de máquinas: lista TODAS as máquinas do operador (não depende da janela)
 @app.callback(
@@ -236,139 +458,195 @@ def preparar_dados(operador):
     Input("store-prep", "data"),
     State("equipamentos-checklist", "value"),
 )
+@cronometrado
 def atualizar_equipamentos(store, sel_prev):
-    opts = [{"label": e, "value": e} for e in store.get("equip_all", [])]
+    prep = obter_prep(store)
+    opts = [{"label": e, "value": e} for e in prep.get("equip_all", [])]
     # 1ª render do operador: seleciona todas; senão preserva interseção
     if sel_prev is None:
-        return opts, store.get("equip_all", [])
-    inter = [v for v in (sel_prev or []) if v in store.get("equip_all", [])]
+        return opts, prep.get("equip_all", [])
+    inter = [v for v in (sel_prev or []) if v in prep.get("equip_all", [])]
     if not inter and sel_prev != []:
-        inter = store.get("equip_all", [])
+        inter = prep.get("equip_all", [])
     return opts, inter
 
+# ===================== FIGURA =====================
+def montar_tracos(dff, equips_sel):
+    """
+    Traços da linha do tempo, um por (Tipo Parada, Equipamento), legenda agrupada por tipo.
+    Retorna (lista de traços, [[tipo, equipamento], ...] na ordem dos traços).
+    """
+    dff = dff[dff["Equipamento"].notna()]
+    # hover: colunas formatadas em bloco + hovertemplate (nada de apply por linha)
+    dff = dff.assign(**{
+        "_ini": dff["Inicio"].dt.strftime("%d/%m %H:%M"),
+        "_fim": dff["Fim"].dt.strftime("%d/%m %H:%M"),
+        "_dur": dff["Duracao Min"].round(1),
+        "_traco": dff["Tipo Parada"] + " | " + dff["Equipamento"],
+    })
+    combos = dff[["_traco","Tipo Parada","Equipamento"]].drop_duplicates("_traco").set_index("_traco")
+    fig = px.timeline(
+        dff, x_start="Inicio", x_end="Fim", y="Nome", color="_traco",
+        custom_data=["Nome", "Equipamento", "Tipo Parada", "Descrição da Operação", "_ini", "_fim", "_dur"],
+        color_discrete_map={t: CORES_TIPO.get(tp, "#222") for t, tp in combos["Tipo Parada"].items()}
+    )
+    fig.update_traces(marker=dict(line=dict(width=1, color="white")), hovertemplate=HOVER_TEMPLATE)
+    tracos = []
+    for tr in fig.data:
+        tipo, equip = combos.loc[tr.name, "Tipo Parada"], combos.loc[tr.name, "Equipamento"]
+        tr.update(name=tipo, legendgroup=tipo)
+        tracos.append([tipo, equip])
+    for tr, (visivel, legenda) in zip(fig.data, visibilidade(tracos, equips_sel)):
+        tr.update(visible=visivel, showlegend=legenda)
+    return list(fig.data), tracos
+
+def visibilidade(tracos, equips_sel):
+    """(visible, showlegend) por traço: só as máquinas selecionadas; 1 item de legenda por tipo."""
+    sel = set(equips_sel); com_legenda = set(); out = []
+    for tipo, equip in tracos:
+        visivel = equip in sel
+        legenda = visivel and tipo not in com_legenda
+        if legenda:
+            com_legenda.add(tipo)
+        out.append((visivel, legenda))
+    return out
+
+def titulo_fig(operador, algum_visivel):
+    if not algum_visivel:
+        return "Sem dados (máquinas filtradas)."
+    return f"<b>Atividades de {operador}</b> — use o seletor de DATA para dar zoom"
+
+def reduzir(dff, janela):
+    """Aplica o nível de detalhe quando o operador tem segmentos demais."""
+    if len(dff) > LIMITE_SEGMENTOS_LOD and janela is not None:
+        return nivel_de_detalhe(dff, janela[0], janela[1], LARGURA_GRAFICO_PX), True
+    return dff, False
+
 # Desenha o gráfico:
-# - troca de operador → mostra PERÍODO COMPLETO do operador
-# - troca de data → dá ZOOM no dia selecionado
-# - filtro de máquinas → oculta/mostra trilhas sem resetar o zoom
+# - troca de operador (ou de versão da base) → figura nova, PERÍODO COMPLETO
+# - troca de data → Patch só do xaxis.range (+ traços, se o nível de detalhe pedir)
+# - filtro de máquinas → Patch só de visible/showlegend dos traços
+# - pan/zoom (só com nível de detalhe ativo) → Patch dos traços quando sai da
+#   região detalhada ou o zoom muda muito. Quem decide é o navegador
+#   (linha_tempo.relayout_lod → relayout-lod): o resto do pan/zoom não vem ao servidor
 @app.callback(
     Output("grafico-linha-tempo", "figure"),
+    Output("store-lod", "data"),
     Input("store-prep", "data"),
     Input("operador-dropdown", "value"),
     Input("data-dropdown", "value"),
     Input("equipamentos-checklist", "value"),
+    Input("relayout-lod", "data"),
+    State("store-lod", "data"),
 )
-def desenhar_fig(store, operador, data_str, equips_sel):
-    dff = pd.DataFrame(store.get("dff", []))
+@cronometrado
+def desenhar_fig(store, operador, data_str, equips_sel, relayoutData, lod):
+    prep = obter_prep(store)
+    dff = prep["dff"]
     if dff.empty:
         fig = px.timeline(pd.DataFrame(columns=["Inicio","Fim","Nome"]), x_start="Inicio", x_end="Fim", y="Nome")
         fig.update_layout(title="Sem dados para exibir.", uirevision=f"op:{operador}")
-        return fig
-
-    dff["Inicio"] = pd.to_datetime(dff["Inicio"]); dff["Fim"] = pd.to_datetime(dff["Fim"])
+        return fig, None
 
-    # aplica filtro de máquinas (padrão = todas)
-    equips_all = store.get("equip_all", [])
+    # filtro de máquinas (padrão = todas)
+    equips_all = prep.get("equip_all", [])
     if not equips_sel:  # [] ou None → usa todas
         equips_sel = equips_all
-    dff = dff[dff["Equipamento"].isin(equips_sel)]
 
-    if dff.empty:
-        fig = px.timeline(pd.DataFrame(columns=["Inicio","Fim","Nome"]), x_start="Inicio", x_end="Fim", y="Nome")
-        fig.update_layout(title="Sem dados (máquinas filtradas).", uirevision=f"op:{operador}")
-        return fig
-
-    dff["Resumo"] = dff.apply(lambda r: (
-        f"Operador: {r['Nome']}<br>"
-        f"Equipamento: {r['Equipamento']}<br>"
-        f"Tipo: {r['Tipo Parada']}<br>"
-        f"Operação: {r['Descrição da Operação']}<br>"
-        f"Início: {r['Inicio'].strftime('%d/%m %H:%M')}<br>"
-        f"Fim: {r['Fim'].strftime('%d/%m %H:%M')}<br>"
-        f"Duração: {round(r['Duracao Min'], 1)} min"
-    ), axis=1)
+    periodo = None
+    if prep.get("tmin") and prep.get("tmax"):
+        periodo = (pd.to_datetime(prep["tmin"]).normalize(),
+                   pd.to_datetime(prep["tmax"]).normalize() + pd.Timedelta(days=1))
 
-    fig = px.timeline(
-        dff, x_start="Inicio", x_end="Fim", y="Nome", color="Tipo Parada",
-        hover_name="Resumo",
-        color_discrete_map={
-            "Efetivo": "#046414", "Parada Gerenciável": "#FF9393", "Parada Mecânica": "#A52657",
-            "Parada Improdutiva": "#FF0000", "Parada Essencial": "#0026FF",
-            "Deslocamento": "#ffee00", "Manobra": "#93c9f7",
-            "Outros": "#8C8C8C", "Outro": "#222"
-        }
-    )
+    trig = ctx.triggered_id
+    chave_fig = chave(store.get("versao"), store.get("operador"))
+    incremental = (trig in ("data-dropdown", "equipamentos-checklist", "relayout-lod")
+                   and lod is not None and lod.get("chave") == chave_fig)
+
+    if incremental:
+        patch = dash.Patch()
+        if trig == "equipamentos-checklist":
+            vis = visibilidade(lod["tracos"], equips_sel)
+            for i, (visivel, legenda) in enumerate(vis):
+                patch["data"][i]["visible"] = visivel
+                patch["data"][i]["showlegend"] = legenda
+            patch["layout"]["title"]["text"] = titulo_fig(operador, any(v for v, _ in vis))
+            return patch, dash.no_update
+
+        if trig == "data-dropdown":
+            if not data_str:
+                return dash.no_update, dash.no_update
+            janela = janela_inicial_do_dia(data_str)
+            # data selecionada → ZOOM no dia
+            patch["layout"]["xaxis"]["range"] = [str(janela[0]), str(janela[1])]
+            patch["layout"]["xaxis"]["autorange"] = False
+        else:
+            janela = janela_do_relayout(relayoutData, periodo)
+            if janela is None:
+                return dash.no_update, dash.no_update
+
+        if not (lod.get("ativo") and precisa_redesenhar(lod, *janela)):
+            return (patch, dash.no_update) if trig == "data-dropdown" else (dash.no_update, dash.no_update)
+        # nível de detalhe mudou → troca só os traços
+        dff_lod, _ = reduzir(dff, janela)
+        dados, tracos = montar_tracos(dff_lod, equips_sel)
+        patch["data"] = [tr.to_plotly_json() for tr in dados]
+        return patch, {**lod, "x0": str(janela[0]), "x1": str(janela[1]), "tracos": tracos}
+
+    # Figura completa: operador/base mudou → PERÍODO COMPLETO
+    janela = periodo
+    if trig == "data-dropdown" and data_str:
+        janela = janela_inicial_do_dia(data_str)
+    dff_lod, lod_ativo = reduzir(dff, janela)
+    dados, tracos = montar_tracos(dff_lod, equips_sel)
+    fig = go.Figure(data=dados)
     fig.update_layout(
-        title=f"<b>Atividades de {operador}</b> — use o seletor de DATA para dar zoom",
+        title=titulo_fig(operador, any(v for v, _ in visibilidade(tracos, equips_sel))),
         plot_bgcolor="#181818", paper_bgcolor="#181818",
         font=dict(color="#e9e9e9"), xaxis_title="Horário", yaxis_title="",
         margin=dict(l=40, r=40, t=80, b=60), height=600,
-        legend=dict(orientation="v", x=1.02, y=1),
-        dragmode="pan",
+        legend=dict(orientation="v", x=1.02, y=1, title_text="Tipo Parada"),
+        barmode="overlay", dragmode="pan",
         uirevision=f"op:{operador}"   # NÃO reseta pan/zoom ao mexer no filtro de máquinas
     )
-    fig.update_traces(marker=dict(line=dict(width=1, color="white")))
+    fig.update_xaxes(type="date")
     fig.update_yaxes(autorange="reversed")
 
-    add_divisores_de_dia(fig, store.get("tmin"), store.get("tmax"))
+    # todos os dias do período: pan/zoom depois são Patch e não redesenham o layout
+    add_divisores_de_dia(fig, prep.get("tmin"), prep.get("tmax"))
 
-    # Range:
-    trig = ctx.triggered_id
-    if trig in (None, "store-prep", "operador-dropdown"):
-        # operador mudou → mostra PERÍODO COMPLETO
-        if store.get("tmin") and store.get("tmax"):
-            x0 = pd.to_datetime(store["tmin"]).normalize()
-            x1 = pd.to_datetime(store["tmax"]).normalize() + pd.Timedelta(days=1)
-            fig.update_xaxes(range=[x0, x1], autorange=False)
-    elif trig == "data-dropdown" and data_str:
-        # data selecionada → ZOOM no dia
-        x0, x1 = janela_inicial_do_dia(data_str)
-        fig.update_xaxes(range=[x0, x1], autorange=False)
+    # Range: PERÍODO COMPLETO (ou o dia, se a figura veio de uma troca de data)
+    if janela:
+        fig.update_xaxes(range=list(janela), autorange=False)
 
     fig.update_xaxes(rangeslider_visible=True, showspikes=True,
                      spikemode="across", spikecolor="#bbb", spikedash="dot")
-    return fig
+    novo_lod = {"chave": chave_fig, "ativo": lod_ativo, "tracos": tracos,
+                "x0": str(janela[0]) if janela else None, "x1": str(janela[1]) if janela else None}
+    return fig, novo_lod
 
-# Cards (usam a janela visível; na 1ª carga, usam período completo)
-@app.callback(
-    Output("stats-div", "children"),
-    Input("store-prep", "data"),
-    Input("operador-dropdown", "value"),
-    Input("data-dropdown", "value"),
+app.clientside_callback(
+    ClientsideFunction(namespace="linha_tempo", function_name="relayout_lod"),
+    Output("relayout-lod", "data"),
     Input("grafico-linha-tempo", "relayoutData"),
-    Input("equipamentos-checklist", "value"),
+    State("store-lod", "data"),
 )
+
+# Cards (usam a janela visível; na 1ª carga, usam período completo)
+@cronometrado
 def atualizar_cards(store, operador, data_str, relayoutData, equips_sel):
-    dff = pd.DataFrame(store.get("dff", []))
+    prep = obter_prep(store)
+    dff = prep["dff"]
     if dff.empty:
         return html.Div("Sem dados para o operador selecionado.", className="text-center text-muted p-3")
 
-    dff["Inicio"] = pd.to_datetime(dff["Inicio"]); dff["Fim"] = pd.to_datetime(dff["Fim"])
-    equips_all = store.get("equip_all", [])
-    if not equips_sel:
-        equips_sel = equips_all
-    dff = dff[dff["Equipamento"].isin(equips_sel)]
-
-    # Janela atual: se não houver relayout, usa período completo
-    if relayoutData is None and store.get("tmin") and store.get("tmax"):
-        x0 = pd.to_datetime(store["tmin"]).normalize()
-        x1 = pd.to_datetime(store["tmax"]).normalize() + pd.Timedelta(days=1)
-    else:
-        x0, x1 = janela_visivel(data_str, relayoutData, store.get("tmin"))
-
-    dff["Inicio_clip"] = dff["Inicio"].clip(lower=x0)
-    dff["Fim_clip"]    = dff["Fim"].clip(upper=x1)
-    dff["Duracao Min Clip"] = (dff["Fim_clip"] - dff["Inicio_clip"]).dt.total_seconds() / 60.0
-    win = dff[dff["Duracao Min Clip"] > 0].copy()
+    # totais da janela visível (mesma consulta para cards/resumo/tabela)
+    win = consultar_janela(store, prep, data_str, relayoutData, equips_sel)
 
     if win.empty:
         return html.Div("Sem atividade nessa janela.", className="text-center text-muted p-3")
 
-    ini_batelada = win["Inicio_clip"].min().strftime("%d/%m %H:%M")
-    fim_batelada = win["Fim_clip"].max().strftime("%d/%m %H:%M")
-    total_horas  = win["Duracao Min Clip"].sum() / 60.0
-
-    def soma_h(tipo):
-        return win.loc[win["Tipo Parada"] == tipo, "Duracao Min Clip"].sum() / 60.0
+    ind = indicadores_janela(win)
 
     def card(t, v, c):
         return dbc.Col(dbc.Card(dbc.CardBody([
@@ -377,51 +655,42 @@ def atualizar_cards(store, operador, data_str, relayoutData, equips_sel):
         ]), className="text-center shadow-sm"), md=2, className="mb-2")
 
     return dbc.Row([
-        card("Início da batelada", ini_batelada, "#6c757d"),
-        card("Fim da batelada",    fim_batelada, "#6c757d"),
-        card("Total (janela)",     f"{total_horas:.2f}h", "#343a40"),
-        card("Efetivo",            f"{soma_h('Efetivo'):.2f}h", "#046414"),
-        card("Gerenciável",        f"{soma_h('Parada Gerenciável'):.2f}h", "#B26B00"),
-        card("Mecânica",           f"{soma_h('Parada Mecânica'):.2f}h", "#A52657"),
+        card("Início da batelada", ind["Inicio"].strftime("%d/%m %H:%M"), "#6c757d"),
+        card("Fim da batelada",    ind["Fim"].strftime("%d/%m %H:%M"), "#6c757d"),
+        card("Total (janela)",     f"{ind['Total h']:.2f}h", "#343a40"),
+        card("Efetivo",            f"{ind['Efetivo h']:.2f}h", "#046414"),
+        card("Gerenciável",        f"{ind['Gerenciável h']:.2f}h", "#B26B00"),
+        card("Mecânica",           f"{ind['Mecânica h']:.2f}h", "#A52657"),
     ], justify="center")
 
+if not MODO_CLIENTE:
+    app.callback(
+        Output("stats-div", "children"),
+        Input("store-prep", "data"),
+        Input("operador-dropdown", "value"),
+        Input("data-dropdown", "value"),
+        Input("grafico-linha-tempo", "relayoutData"),
+        Input("equipamentos-checklist", "value"),
+    )(atualizar_cards)
+
 # Resumo por máquina (horas na janela visível; padrão = período completo)
-@app.callback(
-    Output("resumo-maquinas-div", "children"),
-    Input("store-prep", "data"),
-    Input("data-dropdown", "value"),
-    Input("grafico-linha-tempo", "relayoutData"),
-    Input("equipamentos-checklist", "value"),
-)
+@cronometrado
 def resumo_maquinas(store, data_str, relayoutData, equips_sel):
-    dff = pd.DataFrame(store.get("dff", []))
+    prep = obter_prep(store)
+    dff = prep["dff"]
     if dff.empty:
         return html.Div("Sem máquinas.", className="text-muted")
 
-    dff["Inicio"] = pd.to_datetime(dff["Inicio"]); dff["Fim"] = pd.to_datetime(dff["Fim"])
-    equips_all = store.get("equip_all", [])
-    if not equips_sel:
-        equips_sel = equips_all
-    dff = dff[dff["Equipamento"].isin(equips_sel)]
-
-    if relayoutData is None and store.get("tmin") and store.get("tmax"):
-        x0 = pd.to_datetime(store["tmin"]).normalize()
-        x1 = pd.to_datetime(store["tmax"]).normalize() + pd.Timedelta(days=1)
-    else:
-        x0, x1 = janela_visivel(data_str, relayoutData, store.get("tmin"))
-
-    dff["Inicio_clip"] = dff["Inicio"].clip(lower=x0)
-    dff["Fim_clip"]    = dff["Fim"].clip(upper=x1)
-    dff["Min_clip"]    = (dff["Fim_clip"] - dff["Inicio_clip"]).dt.total_seconds() / 60.0
-    win = dff[dff["Min_clip"] > 0].copy()
+    # totais da janela visível (mesma consulta para cards/resumo/tabela)
+    win = consultar_janela(store, prep, data_str, relayoutData, equips_sel)
 
     if win.empty:
         return html.Div("Sem atividade na janela.", className="text-muted")
 
-    g = (win.groupby("Equipamento", as_index=False)["Min_clip"].sum()
-            .sort_values("Min_clip", ascending=False))
-    g["Horas"] = (g["Min_clip"] / 60.0).round(2)
-    g = g.drop(columns=["Min_clip"])
+    g = (win.groupby("Equipamento", as_index=False)["Duracao Min Clip"].sum()
+            .sort_values("Duracao Min Clip", ascending=False))
+    g["Horas"] = (g["Duracao Min Clip"] / 60.0).round(2)
+    g = g.drop(columns=["Duracao Min Clip"])
 
     table = dbc.Table.from_dataframe(
         g.rename(columns={"Equipamento": "Equip.", "Horas": "Horas (janela)"}),
@@ -429,56 +698,255 @@ def resumo_maquinas(store, data_str, relayoutData, equips_sel):
     )
     return html.Div([html.H6("Resumo por máquina", className="mb-2"), table])
 
+if not MODO_CLIENTE:
+    app.callback(
+        Output("resumo-maquinas-div", "children"),
+        Input("store-prep", "data"),
+        Input("data-dropdown", "value"),
+        Input("grafico-linha-tempo", "relayoutData"),
+        Input("equipamentos-checklist", "value"),
+    )(resumo_maquinas)
+
 # Tabela improdutivas (OPERADOR + JANELA VISÍVEL + MÁQUINAS SELECIONADAS)
 @app.callback(
     Output("tabela-improdutivas", "children"),
     Input("store-prep", "data"),
     Input("operador-dropdown", "value"),
     Input("data-dropdown", "value"),
-    Input("grafico-linha-tempo", "relayoutData"),
+    # modo cliente: relayout com debounce (não dispara a cada passo do pan)
+    Input("relayout-debounce", "data") if MODO_CLIENTE else Input("grafico-linha-tempo", "relayoutData"),
     Input("equipamentos-checklist", "value"),
 )
+@cronometrado
 def tabela_improdutivas(store, operador, data_str, relayoutData, equips_sel):
-    dff = pd.DataFrame(store.get("dff", []))
+    prep = obter_prep(store)
+    dff = prep["dff"]
     if dff.empty:
         return html.Div("Sem dados para o operador selecionado.", className="text-center text-muted p-2")
 
-    dff["Inicio"] = pd.to_datetime(dff["Inicio"]); dff["Fim"] = pd.to_datetime(dff["Fim"])
-    equips_all = store.get("equip_all", [])
-    if not equips_sel:
-        equips_sel = equips_all
-    dff = dff[dff["Equipamento"].isin(equips_sel)]
+    # totais da janela visível (mesma consulta para cards/resumo/tabela)
+    win = consultar_janela(store, prep, data_str, relayoutData, equips_sel)
 
-    # Janela (padrão = período completo)
-    if relayoutData is None and store.get("tmin") and store.get("tmax"):
-        x0 = pd.to_datetime(store["tmin"]).normalize()
-        x1 = pd.to_datetime(store["tmax"]).normalize() + pd.Timedelta(days=1)
-    else:
-        x0, x1 = janela_visivel(data_str, relayoutData, store.get("tmin"))
+    if not tem_improdutivas(win):
+        return html.Div("Sem improdutivas nessa janela.", className="text-center text-muted p-2")
 
-    dff["Inicio_clip"] = dff["Inicio"].clip(lower=x0)
-    dff["Fim_clip"]    = dff["Fim"].clip(upper=x1)
-    dff["Duracao Min Clip"] = (dff["Fim_clip"] - dff["Inicio_clip"]).dt.total_seconds() / 60.0
-    win = dff[dff["Duracao Min Clip"] > 0].copy()
+    return dbc.Table.from_dataframe(
+        improdutivas_janela(win),
+        striped=True, bordered=True, hover=True, className="table-sm"
+    )
 
-    alvo = {"Parada Mecânica", "Parada Gerenciável", "Parada Essencial", "Parada Improdutiva"}
-    win = win[win["Tipo Parada"].isin(alvo)]
-    if win.empty:
-        return html.Div("Sem improdutivas nessa janela.", className="text-center text-muted p-2")
+# Frota: filtros acompanham a versão da base (tipos e dias novos), sem mexer no escolhido
+@app.callback(
+    Output("frota-tipo", "options"),
+    Output("frota-periodo", "min_date_allowed"),
+    Output("frota-periodo", "max_date_allowed"),
+    Input("store-versao", "data"),
+)
+@cronometrado
+def atualizar_filtros_frota(_):
+    dados = base()
+    return (tipos_frota(dados), *dias_resumo(dados))
 
-    resumo = (win.groupby(["Tipo Parada","Descrição da Operação"], as_index=False)
-                 .agg(Minutos=("Duracao Min Clip","sum"),
-                      Ocorrências=("Duracao Min Clip","count")))
-    resumo["Minutos"] = resumo["Minutos"].round(0).astype(int)
+# Frota: só desenha com a aba aberta (a página abre na aba do operador)
+@app.callback(
+    Output("frota-ranking", "figure"),
+    Output("frota-mapa", "figure"),
+    Input("abas", "active_tab"),
+    Input("frota-dimensao", "value"),
+    Input("frota-tipo", "value"),
+    Input("frota-periodo", "start_date"),
+    Input("frota-periodo", "end_date"),
+    Input("store-versao", "data"),
+)
+@cronometrado
+def desenhar_frota(aba, dimensao, tipo, dia_ini, dia_fim, _):
+    if aba != "aba-frota":
+        return dash.no_update, dash.no_update
+    r = recorte_frota(base(), dimensao, dia_ini, dia_fim)
+    if r.empty or tipo is None:
+        vazia = fig_vazia_frota("Sem dados no período.")
+        return vazia, vazia
+    tot = totais_frota(r, dimensao, tipo)
+    return fig_ranking_frota(tot, dimensao, tipo), fig_mapa_frota(r, tot, dimensao, tipo)
+
+# Exportação: links do operador seguem a janela visível e as máquinas escolhidas.
+# Montados no navegador (linha_tempo.links_exportacao), então pan/zoom não vem ao
+# servidor; daqui sai só, por operador, o período (segundos, como segmentos_compactos)
+# e as rotas.
+@app.callback(
+    Output("store-exportacao", "data"),
+    Input("store-prep", "data"),
+)
+@cronometrado
+def base_exportacao(store):
+    prep = obter_prep(store)
+    operador = (store or {}).get("operador")
+    rotas = [app.get_relative_path(f"/exportar/{c}.{f}") for c, f in ITENS_EXPORTACAO]
+    if prep["dff"].empty or operador is None:
+        return {"rotas": rotas, "operador": None}
+    return {"rotas": rotas, "operador": operador,
+            "tmin": int(para_us(prep["tmin"]) // 1_000_000), "tmax": int(para_us(prep["tmax"]) // 1_000_000)}
+
+app.clientside_callback(
+    ClientsideFunction(namespace="linha_tempo", function_name="links_exportacao"),
+    [Output(f"exportar-{c}-{f}", "href") for c, f in ITENS_EXPORTACAO],
+    Input("store-exportacao", "data"),
+    Input("data-dropdown", "value"),
+    Input("grafico-linha-tempo", "relayoutData"),
+    Input("equipamentos-checklist", "value"),
+)
 
-    tipo_ordem = {"Parada Gerenciável":1, "Parada Mecânica":2, "Parada Essencial":3, "Parada Improdutiva":4}
-    resumo["ord"] = resumo["Tipo Parada"].map(tipo_ordem).fillna(9)
-    resumo = resumo.sort_values(["ord","Minutos"], ascending=[True, False]).drop(columns=["ord"])
+# Exportação da frota: todos os operadores, dias inteiros do período
+@app.callback(
+    [Output(f"frota-exportar-{c}-{f}", "href") for c, f in ITENS_EXPORTACAO],
+    Input("frota-periodo", "start_date"),
+    Input("frota-periodo", "end_date"),
+    Input("store-versao", "data"),
+)
+@cronometrado
+def links_exportacao_frota(dia_ini, dia_fim, _):
+    d0, d1 = dias_resumo(base())
+    dia_ini, dia_fim = dia_ini or d0, dia_fim or d1
+    if dia_ini is None or dia_fim is None:
+        return ["#"] * len(ITENS_EXPORTACAO)
+    x0 = pd.Timestamp(dia_ini).normalize(); x1 = pd.Timestamp(dia_fim).normalize() + pd.Timedelta(days=1)
+    return [url_exportacao(c, f, x0, x1) for c, f in ITENS_EXPORTACAO]
+
+@server.route("/exportar/<conteudo>.<formato>")
+def exportar_arquivo(conteudo, formato):
+    """
+    ?inicio=&fim= (janela [inicio, fim)), &operador= (sem → todos), &equip= (repetido; sem → todas).
+    A versão da base é pega uma vez: uma recarga no meio do download não mistura versões.
+    """
+    if conteudo not in CONTEUDOS or formato not in FORMATOS:
+        flask.abort(404)
+    args = flask.request.args
+    try:
+        x0, x1 = pd.Timestamp(args["inicio"]), pd.Timestamp(args["fim"])
+    except (KeyError, ValueError):
+        flask.abort(400)
+    dados = base()
+    operador = args.get("operador")
+    operadores = [operador] if operador else dados.nomes
+    corpo = exportar(dados, conteudo, formato, operadores, x0, x1, args.getlist("equip") or None)
+    resposta = flask.Response(flask.stream_with_context(corpo), mimetype=FORMATOS[formato], headers={
+        "Content-Disposition": f'attachment; filename="{nome_exportacao(conteudo, formato, x0, x1, operador)}"'})
+    # stream_with_context só repassa o close() a partir do primeiro pedaço
+    resposta.call_on_close(corpo.close)
+    return resposta
+
+# ===================== MÉTRICAS =====================
+# Cada POST de callback do Dash vira uma observação (ver metricas.py): tempo da
+# requisição por callback e por componente que disparou (o ctx.triggered_id),
+# tempo só da função (@cronometrado — a diferença é leitura do Store/estado e
+# serialização da figura) e bytes de ida e de volta. GET /metrics expõe tudo.
+# Com TIMELINE_PERFIL_LENTO_MS, qualquer requisição mais lenta que isso deixa o
+# perfil amostrado em TIMELINE_PERFIL_DIR (downloads contam até o fim do stream).
+ROTA_CALLBACK = app.config.routes_pathname_prefix + "_dash-update-component"
+amostrador = Amostrador() if ATIVAS and PERFIL_LENTO_MS > 0 else None
+
+def nome_callback(corpo):
+    """Nome da função do callback a partir do corpo do POST (output → callback_map)."""
+    cb = app.callback_map.get(corpo.get("output"), {}).get("callback")
+    return getattr(cb, "__name__", None) or str(corpo.get("output", "?"))
+
+def gatilho(corpo):
+    """Como ctx.triggered_id: componente do 1º changedPropIds ("" na chamada inicial)."""
+    ids = corpo.get("changedPropIds") or []
+    return ids[0].rsplit(".", 1)[0] if ids else ""
+
+if ATIVAS:
+    @server.before_request
+    def iniciar_medicao():
+        flask.g.inicio_medicao = time.perf_counter()
+        if amostrador is not None:
+            amostrador.iniciar(threading.get_ident())
+
+    @server.after_request
+    def medir_callback(resposta):
+        req = flask.request
+        if req.path != ROTA_CALLBACK or "inicio_medicao" not in flask.g:
+            return resposta
+        corpo = req.get_json(silent=True) or {}
+        nome = nome_callback(corpo)
+        CALLBACK_SEGUNDOS.observar(time.perf_counter() - flask.g.inicio_medicao, nome, gatilho(corpo))
+        funcao_s = tempo_funcao()
+        if funcao_s is not None:
+            CALLBACK_FUNCAO_SEGUNDOS.observar(funcao_s, nome)
+        CALLBACK_BYTES.observar(req.content_length or 0, nome, "requisicao")
+        CALLBACK_BYTES.observar(resposta.content_length or 0, nome, "resposta")
+        flask.g.nome_medicao = nome
+        persistir()
+        return resposta
+
+    # teardown: roda depois do stream (exportação) e também quando a requisição falha
+    @server.teardown_request
+    def encerrar_perfil(_exc):
+        if amostrador is None or "inicio_medicao" not in flask.g:
+            return
+        pilhas = amostrador.parar(threading.get_ident())
+        segundos = time.perf_counter() - flask.g.inicio_medicao
+        if segundos * 1000 >= PERFIL_LENTO_MS and pilhas:
+            caminho = gravar_perfil(pilhas, flask.g.get("nome_medicao") or flask.request.path.strip("/"), segundos)
+            log.warning("requisição lenta: %s %.0f ms → perfil em %s", flask.request.path, segundos * 1000, caminho)
+
+    @server.route("/metrics")
+    def metricas_prometheus():
+        return flask.Response(texto_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ===================== MODO CLIENTE =====================
+def segmentos_compactos(prep):
+    """
+    Segmentos do operador em arrays para o navegador (enviados uma vez por operador):
+    segundos desde t0 (horário local "ingênuo"), códigos de equipamento/tipo.
+    """
+    dff = prep["dff"]
+    if dff.empty:
+        return {"n": 0}
+    ini = para_us(dff["Inicio"].to_numpy()) // 1_000_000
+    fim = para_us(dff["Fim"].to_numpy()) // 1_000_000
+    eq_cod, equips = pd.factorize(dff["Equipamento"])   # NaN → -1 (nunca selecionado)
+    tp_cod, tipos  = pd.factorize(dff["Tipo Parada"])
+    t0 = int(ini.min())
+    return {
+        "n": len(dff), "t0": t0,
+        "ini": (ini - t0).tolist(), "fim": (fim - t0).tolist(),
+        "eq": eq_cod.tolist(), "tp": tp_cod.tolist(),
+        "equips": [str(e) for e in equips], "tipos": [str(t) for t in tipos],
+        "dur_max": int((fim - ini).max()),
+        "tmin": int(para_us(prep["tmin"]) // 1_000_000),
+        "tmax": int(para_us(prep["tmax"]) // 1_000_000),
+    }
 
-    resumo = resumo.rename(columns={"Tipo Parada":"Tipo","Descrição da Operação":"Apontamento"})
-    return dbc.Table.from_dataframe(
-        resumo[["Tipo","Apontamento","Minutos","Ocorrências"]],
-        striped=True, bordered=True, hover=True, className="table-sm"
+if MODO_CLIENTE:
+    @app.callback(
+        Output("store-segmentos", "data"),
+        Input("store-prep", "data"),
+    )
+    @cronometrado
+    def enviar_segmentos(store):
+        return segmentos_compactos(obter_prep(store))
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="linha_tempo", function_name="debounce_relayout"),
+        Output("relayout-debounce", "data"),
+        Input("grafico-linha-tempo", "relayoutData"),
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace="linha_tempo", function_name="cards"),
+        Output("stats-div", "children"),
+        Input("store-segmentos", "data"),
+        Input("data-dropdown", "value"),
+        Input("grafico-linha-tempo", "relayoutData"),
+        Input("equipamentos-checklist", "value"),
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace="linha_tempo", function_name="resumo_maquinas"),
+        Output("resumo-maquinas-div", "children"),
+        Input("store-segmentos", "data"),
+        Input("data-dropdown", "value"),
+        Input("grafico-linha-tempo", "relayoutData"),
+        Input("equipamentos-checklist", "value"),
     )
 
 # ===================== RUN =====================
@@ -0,0 +1,177 @@
+// Modo cliente (TIMELINE_MODO_CLIENTE=1): cards e resumo por máquina recalculados
+// no navegador a cada pan/zoom, a partir dos segmentos compactos do operador
+// (store-segmentos, ver segmentos_compactos em app.py). Instantes em segundos,
+// horário local "ingênuo" tratado como UTC dos dois lados.
+(function () {
+    var DIA = 86400;
+    var ESPERA_DEBOUNCE_MS = 400;
+
+    function h(tipo, props, ns) {
+        return {type: tipo, namespace: ns || "dash_html_components", props: props};
+    }
+    function dbc(tipo, props) { return h(tipo, props, "dash_bootstrap_components"); }
+
+    function paraSegundos(v) {
+        if (typeof v === "number") return v / 1000;   // plotly pode mandar ms
+        var s = String(v).trim().replace(" ", "T");
+        if (/^\d{4}-\d{2}-\d{2}$/.test(s)) s += "T00:00:00";
+        if (!/([zZ]|[+-]\d\d:?\d\d)$/.test(s)) s += "Z";
+        return Date.parse(s) / 1000;
+    }
+    function inicioDoDia(t) { return Math.floor(t / DIA) * DIA; }
+
+    // Eixo x do relayout em segundos, ou null se ele não mexeu no eixo x
+    function faixaDoRelayout(rd) {
+        if ("xaxis.range[0]" in rd && "xaxis.range[1]" in rd)
+            return [paraSegundos(rd["xaxis.range[0]"]), paraSegundos(rd["xaxis.range[1]"])];
+        if (Array.isArray(rd["xaxis.range"]) && rd["xaxis.range"].length === 2)
+            return [paraSegundos(rd["xaxis.range"][0]), paraSegundos(rd["xaxis.range"][1])];
+        if ("xaxis.rangeslider.range[0]" in rd && "xaxis.rangeslider.range[1]" in rd)
+            return [paraSegundos(rd["xaxis.rangeslider.range[0]"]), paraSegundos(rd["xaxis.rangeslider.range[1]"])];
+        return null;
+    }
+
+    // Mesmo critério de janela_atual/janela_visivel (app.py); seg só precisa de tmin/tmax
+    function janela(seg, dataStr, rd) {
+        if (rd === null || rd === undefined) {
+            return [inicioDoDia(seg.tmin), inicioDoDia(seg.tmax) + DIA];
+        }
+        var base = dataStr ? inicioDoDia(paraSegundos(dataStr)) : inicioDoDia(seg.tmin);
+        if (rd["xaxis.autorange"]) return [base, base + DIA];
+        return faixaDoRelayout(rd) || [base, base + DIA];
+    }
+
+    // Recorta os segmentos na janela; segmentos vêm ordenados por início.
+    function totais(seg, dataStr, rd, equipsSel) {
+        var w = janela(seg, dataStr, rd);
+        var x0 = w[0] - seg.t0, x1 = w[1] - seg.t0;
+        var sel = {};
+        var lista = (equipsSel && equipsSel.length) ? equipsSel : seg.equips;
+        for (var k = 0; k < lista.length; k++) sel[lista[k]] = true;
+        var eqOk = seg.equips.map(function (e) { return !!sel[e]; });
+
+        // primeiro candidato: início > x0 - maior duração (busca binária)
+        var lo = 0, hi = seg.n, alvo = x0 - seg.dur_max;
+        while (lo < hi) { var mid = (lo + hi) >> 1; if (seg.ini[mid] <= alvo) lo = mid + 1; else hi = mid; }
+
+        var r = {total: 0, porTipo: {}, porEquip: {}, ini: null, fim: null};
+        for (var i = lo; i < seg.n && seg.ini[i] < x1; i++) {
+            if (seg.eq[i] < 0 || !eqOk[seg.eq[i]]) continue;
+            var a = Math.max(seg.ini[i], x0), b = Math.min(seg.fim[i], x1);
+            if (b <= a) continue;
+            var d = b - a, tipo = seg.tipos[seg.tp[i]], eq = seg.equips[seg.eq[i]];
+            r.total += d;
+            r.porTipo[tipo] = (r.porTipo[tipo] || 0) + d;
+            r.porEquip[eq] = (r.porEquip[eq] || 0) + d;
+            if (r.ini === null || a < r.ini) r.ini = a;
+            if (r.fim === null || b > r.fim) r.fim = b;
+        }
+        r.t0 = seg.t0;
+        return r;
+    }
+
+    function fmtDiaHora(t) {
+        var d = new Date(t * 1000);
+        function p(n) { return (n < 10 ? "0" : "") + n; }
+        return p(d.getUTCDate()) + "/" + p(d.getUTCMonth() + 1) + " " + p(d.getUTCHours()) + ":" + p(d.getUTCMinutes());
+    }
+    // "aaaa-mm-ddTHH:MM:SS[.mmm]" ingênuo, como o Timestamp.isoformat do servidor
+    function isoIngenuo(t) {
+        return new Date(Math.round(t * 1000)).toISOString().slice(0, 23).replace(/\.000$/, "");
+    }
+    function horas(seg) { return (seg / 3600).toFixed(2) + "h"; }
+    // float no formato do Python (45 → "45.0"), igual à tabela do servidor
+    function numPy(x) { return Number.isInteger(x) ? x.toFixed(1) : String(x); }
+
+    function card(t, v, c) {
+        return dbc("Col", {
+            md: 2, className: "mb-2",
+            children: dbc("Card", {
+                className: "text-center shadow-sm",
+                children: dbc("CardBody", {children: [
+                    h("H4", {children: v, style: {color: c, fontWeight: "bold"}}),
+                    h("P", {children: t, className: "text-muted"})
+                ]})
+            })
+        });
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        linha_tempo: {
+            cards: function (seg, dataStr, rd, equipsSel) {
+                if (!seg || !seg.n)
+                    return h("Div", {children: "Sem dados para o operador selecionado.", className: "text-center text-muted p-3"});
+                var r = totais(seg, dataStr, rd, equipsSel);
+                if (r.ini === null)
+                    return h("Div", {children: "Sem atividade nessa janela.", className: "text-center text-muted p-3"});
+                var t = function (tipo) { return horas(r.porTipo[tipo] || 0); };
+                return dbc("Row", {justify: "center", children: [
+                    card("Início da batelada", fmtDiaHora(r.ini + r.t0), "#6c757d"),
+                    card("Fim da batelada",    fmtDiaHora(r.fim + r.t0), "#6c757d"),
+                    card("Total (janela)",     horas(r.total), "#343a40"),
+                    card("Efetivo",            t("Efetivo"), "#046414"),
+                    card("Gerenciável",        t("Parada Gerenciável"), "#B26B00"),
+                    card("Mecânica",           t("Parada Mecânica"), "#A52657")
+                ]});
+            },
+
+            resumo_maquinas: function (seg, dataStr, rd, equipsSel) {
+                if (!seg || !seg.n)
+                    return h("Div", {children: "Sem máquinas.", className: "text-muted"});
+                var r = totais(seg, dataStr, rd, equipsSel);
+                var equips = Object.keys(r.porEquip).sort();
+                if (!equips.length)
+                    return h("Div", {children: "Sem atividade na janela.", className: "text-muted"});
+                equips.sort(function (a, b) { return r.porEquip[b] - r.porEquip[a]; });
+                var linhas = equips.map(function (e) {
+                    return h("Tr", {children: [h("Td", {children: e}),
+                                               h("Td", {children: numPy(Math.round(r.porEquip[e] / 36) / 100)})]});
+                });
+                var tabela = dbc("Table", {
+                    striped: true, bordered: true, hover: true, className: "table-sm mb-0",
+                    children: [h("Thead", {children: h("Tr", {children: [h("Th", {children: "Equip."}),
+                                                                          h("Th", {children: "Horas (janela)"})]})}),
+                               h("Tbody", {children: linhas})]
+                });
+                return h("Div", {children: [h("H6", {children: "Resumo por máquina", className: "mb-2"}), tabela]});
+            },
+
+            // Links de exportação do operador (mesma query de url_exportacao em app.py)
+            links_exportacao: function (exp, dataStr, rd, equipsSel) {
+                if (!exp) throw window.dash_clientside.PreventUpdate;
+                if (!exp.operador) return exp.rotas.map(function () { return "#"; });
+                var w = janela(exp, dataStr, rd);
+                var q = [["inicio", isoIngenuo(w[0])], ["fim", isoIngenuo(w[1])], ["operador", exp.operador]];
+                (equipsSel || []).forEach(function (e) { q.push(["equip", e]); });
+                var query = q.map(function (p) { return encodeURIComponent(p[0]) + "=" + encodeURIComponent(p[1]); }).join("&");
+                return exp.rotas.map(function (r) { return r + "?" + query; });
+            },
+
+            // Nível de detalhe: o relayout só vai ao servidor (desenhar_fig) quando a
+            // janela sai da região detalhada (desenhada ± 1 largura) ou o zoom muda
+            // mais de 2x — mesmo critério de precisa_redesenhar; sem LOD, nunca.
+            relayout_lod: function (rd, lod) {
+                var nada = window.dash_clientside.no_update;
+                if (!rd || !lod || !lod.ativo || !lod.x0 || !lod.x1) return nada;
+                if (rd["xaxis.autorange"]) return rd;
+                var w = faixaDoRelayout(rd);
+                if (!w) return nada;
+                var a = paraSegundos(lod.x0), b = paraSegundos(lod.x1), larg = b - a;
+                if (w[0] < a - larg || w[1] > b + larg) return rd;
+                var razao = larg > 0 ? (w[1] - w[0]) / larg : 0;
+                return (razao >= 0.5 && razao <= 2) ? nada : rd;
+            },
+
+            // Segura o relayout até o pan/zoom parar; só o último evento segue pro servidor.
+            debounce_relayout: function (rd) {
+                var ns = window.dash_clientside.linha_tempo;
+                var seq = ns._seq = (ns._seq || 0) + 1;
+                return new Promise(function (resolve) {
+                    setTimeout(function () {
+                        resolve(seq === ns._seq ? rd : window.dash_clientside.no_update);
+                    }, ESPERA_DEBOUNCE_MS);
+                });
+            }
+        }
+    });
+})();
@@ -0,0 +1,67 @@
+"""
+Benchmark dos divisores de dia (redesenho da figura) para períodos de 90 e 365 dias.
+
+    python bench/bench_divisores.py [--repeticoes 3]
+
+Compara o jeito antigo (add_vline + add_annotation por dia) com
+add_divisores_de_dia (cache por (tmin, tmax) + uma atribuição de layout).
+Não importa app.py (que carrega a planilha); a função é copiada do módulo
+via ast para medir exatamente o código em produção.
+"""
+import argparse
+import ast
+import os
+import time
+from functools import lru_cache
+
+import pandas as pd
+import plotly.graph_objects as go
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def carregar_funcoes(nomes):
+    """Extrai funções de app.py sem executar o módulo inteiro."""
+    with open(os.path.join(RAIZ, "app.py"), encoding="utf-8") as f:
+        arvore = ast.parse(f.read())
+    corpo = [n for n in arvore.body if isinstance(n, ast.FunctionDef) and n.name in nomes]
+    ns = {"pd": pd, "lru_cache": lru_cache}
+    exec(compile(ast.Module(body=corpo, type_ignores=[]), "app.py", "exec"), ns)
+    return ns
+
+def divisores_antigo(fig, tmin, tmax):
+    tmin = pd.to_datetime(tmin); tmax = pd.to_datetime(tmax)
+    cur = pd.to_datetime(tmin.date())
+    end_day = pd.to_datetime(tmax.date()) + pd.Timedelta(days=1)
+    while cur <= end_day:
+        fig.add_vline(x=cur, line_width=1, line_dash="dot", line_color="#9aa0a6")
+        fig.add_annotation(x=cur + pd.Timedelta(hours=12), y=1.08, yref="paper",
+                           text=cur.strftime("Dia %d/%m"),
+                           showarrow=False, font=dict(size=11, color="#e0e0e0"))
+        cur += pd.Timedelta(days=1)
+
+def medir(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        fig = go.Figure()
+        t = time.perf_counter(); fn(fig); tempos.append(time.perf_counter() - t)
+    return min(tempos)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args()
+
+    ns = carregar_funcoes({"divisores_de_dia", "add_divisores_de_dia"})
+    print(f"{'dias':>5} | {'antigo (s)':>10} | {'novo 1ª (s)':>11} | {'novo cache (s)':>14} | {'janela 1 dia (s)':>16}")
+    for dias in (90, 365):
+        tmin = pd.Timestamp("2025-01-01 06:00"); tmax = tmin + pd.Timedelta(days=dias)
+        antigo = medir(lambda f: divisores_antigo(f, tmin, tmax), 1)   # lento: 1 rodada basta
+        ns["divisores_de_dia"].cache_clear()
+        primeira = medir(lambda f: ns["add_divisores_de_dia"](f, tmin, tmax), 1)
+        cache = medir(lambda f: ns["add_divisores_de_dia"](f, tmin, tmax), args.repeticoes)
+        janela = (tmin + pd.Timedelta(days=10), tmin + pd.Timedelta(days=11))
+        recorte = medir(lambda f: ns["add_divisores_de_dia"](f, tmin, tmax, janela), args.repeticoes)
+        print(f"{dias:>5} | {antigo:>10.3f} | {primeira:>11.3f} | {cache:>14.3f} | {recorte:>16.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Memória e filtros da base residente: texto (limpar_base) × compacta (compactar).
+
+    python bench/bench_memoria.py ["Linha do tempo.xlsx"] [--sheet Plan1] [--replicar 1] [--repeticoes 5]
+
+Mostra os bytes por coluna antes/depois (relatorio_memoria) e o tempo de
+df["Nome"] == operador e de df["Equipamento"].isin(equipamentos) nas duas
+representações. --replicar N repete a base N vezes (planilha pequena →
+tamanho de produção).
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from ingestao import compactar, concatenar, ler_bruta, limpar_base, relatorio_memoria  # noqa: E402
+
+def medir(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t = time.perf_counter(); fn(); tempos.append(time.perf_counter() - t)
+    return min(tempos)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("arquivo", nargs="?", default=os.path.join(RAIZ, "Linha do tempo.xlsx"))
+    ap.add_argument("--sheet", default="Plan1")
+    ap.add_argument("--replicar", type=int, default=1)
+    ap.add_argument("--repeticoes", type=int, default=5)
+    args = ap.parse_args()
+
+    limpo = limpar_base(ler_bruta(args.arquivo, args.sheet))
+    compacto = compactar(limpo)
+    if args.replicar > 1:
+        limpo = pd.concat([limpo] * args.replicar, ignore_index=True)
+        compacto = concatenar([compacto] * args.replicar)
+    print(f"{len(limpo)} registros\n")
+    r = relatorio_memoria(limpo, compacto)
+    print(r.assign(antes=r["antes"] / 2**20, depois=r["depois"] / 2**20)
+          .rename(columns={"antes": "antes (MB)", "depois": "depois (MB)"}).round(2).to_string())
+
+    operador = limpo["Nome"].mode().iat[0]
+    equips = sorted(limpo["Equipamento"].dropna().unique())[::2]
+    print(f"\n{'filtro':<28} | {'texto (ms)':>10} | {'códigos (ms)':>12}")
+    for nome, fn in [("Nome == operador", lambda d: d["Nome"] == operador),
+                     ("Equipamento.isin(metade)", lambda d: d["Equipamento"].isin(equips)),
+                     ("fatia do operador", lambda d: d[d["Nome"] == operador])]:
+        texto = medir(lambda: fn(limpo), args.repeticoes) * 1000
+        codigos = medir(lambda: fn(compacto), args.repeticoes) * 1000
+        print(f"{nome:<28} | {texto:>10.2f} | {codigos:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Suíte de benchmark: carga, classificação, agrupamento e callbacks do app em
+planilhas sintéticas (gerar_planilha.py), com resultado em JSON.
+
+    python bench/bench_suite.py [--linhas 10000 100000 1000000] [--repeticoes 3] [--operadores N]
+                                [--pasta bench/dados] [--formato xlsx|csv] [--saida arquivo.json]
+    python bench/bench_suite.py --comparar antes.json depois.json
+
+Cada tamanho roda num processo próprio, numa pasta onde a planilha gerada é o
+"Linha do tempo.xlsx" (gerada uma vez por tamanho/semente e reaproveitada):
+o app carrega a base ao ser importado, e a memória de um tamanho não
+contamina o outro. Medidas:
+- etapas da carga: leitura (ler_bruta), limpeza (limpar_base), classificação
+  (classificar), compactação, agrupamento (agrupar_paradas), versão (Dados:
+  partição + resumo diário) e a inicialização do app (import, base do zero);
+- callbacks, no operador com mais segmentos: preparar_dados (+ segmentos do
+  modo cliente), desenhar_fig (figura completa, zoom no dia, zoom de 2h) e
+  atualizar_cards / resumo_maquinas / tabela_improdutivas (período, dia, 2h),
+  com os caches de operador e de janela limpos a cada chamada.
+Tempo = melhor de N (e mediana); pico_mb = maior alocação viva (tracemalloc,
+numa rodada à parte); bytes = resposta serializada como o Dash envia. A
+leitura roda uma vez só (1M linhas de xlsx leva minutos).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ARQUIVO = "Linha do tempo.xlsx"   # nome que o app procura (app.ARQUIVO)
+ARQUIVO_CSV = "Linha do tempo.csv"  # --formato csv: entra por TIMELINE_FONTES
+SHEET = "Plan1"
+TAMANHOS = [10_000, 100_000, 1_000_000]
+# o processo de cada tamanho só enxerga a planilha gerada
+AMBIENTE = {"TIMELINE_SNAPSHOT_DIR": "", "TIMELINE_RECARGA_S": "0", "TIMELINE_FONTES": "",
+            "TIMELINE_PASTA_EXPORTS": "", "TIMELINE_BUFFERS": "", "TIMELINE_MODO_CLIENTE": "0",
+            "TIMELINE_CACHE": "memoria"}
+
+# ===================== MEDIÇÃO =====================
+def medir(fn, repeticoes):
+    """(resultado, {"s", "s_mediana", "pico_mb"}): N rodadas cronometradas + 1 com tracemalloc."""
+    tempos = []
+    for _ in range(repeticoes):
+        t = time.perf_counter(); r = fn(); tempos.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        fn()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return r, {"s": round(min(tempos), 6), "s_mediana": round(statistics.median(tempos), 6),
+               "pico_mb": round(pico / 2**20, 3)}
+
+def bytes_resposta(valor):
+    import plotly.io.json as pjson
+    valores = valor if isinstance(valor, tuple) else (valor,)
+    return sum(len(pjson.to_json_plotly(v)) for v in valores if v is not None)
+
+def disparado_por(id_componente):
+    """ctx.triggered_id fora de uma requisição (contexto interno do Dash, como nos testes dele)."""
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+    context_value.set(AttributeDict(triggered_inputs=[{"prop_id": f"{id_componente}.value", "value": None}]))
+
+# ===================== UM TAMANHO (processo filho) =====================
+def etapas_carga(arquivo, repeticoes):
+    from dados import Dados
+    from ingestao import classificar, compactar, ler_bruta, limpar_base
+    from segmentos import agrupar_paradas, montar_segmentos
+
+    out = {}
+    bruta, out["leitura"] = medir(lambda: ler_bruta(arquivo, SHEET), 1)
+    limpa, out["limpeza"] = medir(lambda: limpar_base(bruta), repeticoes)
+    _, out["classificacao"] = medir(lambda: classificar(bruta["Descrição do Grupo da Operação"],
+                                                       bruta["Descrição da Operação"]), repeticoes)
+    base, out["compactacao"] = medir(lambda: compactar(limpa), repeticoes)
+    _, out["agrupamento"] = medir(lambda: agrupar_paradas(base), repeticoes)
+    segmentos = montar_segmentos(base)
+    _, out["versao"] = medir(lambda: Dados(base, segmentos, {}, {}, "bench"), repeticoes)
+    info = {"registros_brutos": len(bruta), "registros": len(base), "segmentos": len(segmentos),
+            "operadores": int(base["Nome"].nunique())}
+    return out, info
+
+def callbacks(M, repeticoes):
+    import pandas as pd
+    dados = M.base()
+    operador = max(dados.nomes, key=lambda n: dados.operadores[n]["fatia"][1] - dados.operadores[n]["fatia"][0])
+    datas = dados.operadores[operador]["datas"]
+    dia = str(datas[len(datas) // 2])
+    # 2h a partir do 1º apontamento do dia (turno noturno: 08–10h pode estar vazio)
+    inicio = M.montar_prep(dados, operador)["dff"]["Inicio"]
+    x0 = inicio[inicio >= pd.Timestamp(dia)].min()
+    zoom = {"xaxis.range[0]": str(x0), "xaxis.range[1]": str(x0 + pd.Timedelta(hours=2))}
+    janelas = {"periodo": None, "dia": {}, "2h": zoom}
+
+    def frio(fn):
+        """Sem cache de operador/janela: mede o cálculo, não o acerto no cache."""
+        def rodar():
+            M.cache_prep.clear(); M.cache_janela.clear()
+            return fn()
+        return rodar
+
+    out = {}
+    def registrar(nome, fn, gatilho):
+        disparado_por(gatilho)
+        r, m = medir(frio(fn), repeticoes)
+        out[nome] = {**m, "bytes": bytes_resposta(r)}
+        return r
+
+    store = registrar("preparar_dados", lambda: M.preparar_dados(operador, None), "operador-dropdown")
+    registrar("segmentos_compactos", lambda: M.segmentos_compactos(M.obter_prep(store)), "store-prep")
+    _, lod = registrar("desenhar_fig/completa", lambda: M.desenhar_fig(store, operador, dia, [], None, None),
+                       "operador-dropdown")
+    registrar("desenhar_fig/dia", lambda: M.desenhar_fig(store, operador, dia, [], None, lod), "data-dropdown")
+    registrar("desenhar_fig/2h", lambda: M.desenhar_fig(store, operador, dia, [], zoom, lod), "relayout-lod")
+    for nome, rd in janelas.items():
+        registrar(f"atualizar_cards/{nome}", lambda: M.atualizar_cards(store, operador, dia, rd, []),
+                  "grafico-linha-tempo")
+        registrar(f"resumo_maquinas/{nome}", lambda: M.resumo_maquinas(store, dia, rd, []), "grafico-linha-tempo")
+        registrar(f"tabela_improdutivas/{nome}", lambda: M.tabela_improdutivas(store, operador, dia, rd, []),
+                  "grafico-linha-tempo")
+    n_seg = int(len(M.obter_prep(store)["dff"]))
+    return out, {"operador": operador, "segmentos_operador": n_seg, "dia": dia,
+                 "periodo": [str(pd.Timestamp(dados.operadores[operador]["tmin"])),
+                             str(pd.Timestamp(dados.operadores[operador]["tmax"]))]}
+
+def rodar_tamanho(pasta, repeticoes):
+    """Roda dentro da pasta do tamanho; devolve o dict do resultado."""
+    os.chdir(pasta)
+    etapas, info = etapas_carga(ARQUIVO if os.path.exists(ARQUIVO) else ARQUIVO_CSV, repeticoes)
+    t = time.perf_counter()
+    import app as M
+    etapas["inicializacao_app"] = {"s": round(time.perf_counter() - t, 6)}
+    cbs, info_cb = callbacks(M, repeticoes)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # Linux: KB
+    return {**info, **info_cb, "etapas": etapas, "callbacks": cbs, "rss_max_mb": round(rss, 1)}
+
+# ===================== SUÍTE (processo pai) =====================
+def preparar_planilha(pasta_base, linhas, semente, formato, operadores=None):
+    """Pasta do tamanho com a planilha gerada (reaproveita se já existe)."""
+    import gerar_planilha
+    pasta = os.path.join(pasta_base, f"{linhas}-s{semente}{f'-op{operadores}' if operadores else ''}-{formato}")
+    destino = os.path.join(pasta, ARQUIVO if formato == "xlsx" else ARQUIVO_CSV)
+    if not os.path.exists(destino):
+        t = time.perf_counter()
+        tmp = destino + ".tmp." + formato
+        gerar_planilha.gravar(gerar_planilha.gerar(linhas, operadores, semente=semente), tmp, SHEET)
+        os.replace(tmp, destino)
+        print(f"  gerada {destino} ({time.perf_counter() - t:.1f}s)", file=sys.stderr)
+    return pasta
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def suite(args):
+    import numpy as np
+    import pandas as pd
+    resultado = {"quando": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit_atual(),
+                 "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                 "cpus": os.cpu_count(), "repeticoes": args.repeticoes, "formato": args.formato,
+                 "operadores": args.operadores, "tamanhos": []}
+    for linhas in args.linhas:
+        print(f"{linhas} linhas", file=sys.stderr)
+        pasta = preparar_planilha(args.pasta, linhas, args.semente, args.formato, args.operadores)
+        env = {**os.environ, **AMBIENTE}
+        if args.formato == "csv":
+            env["TIMELINE_FONTES"] = os.path.join(pasta, "*.csv")
+        p = subprocess.run([sys.executable, os.path.abspath(__file__), "--interno", pasta,
+                            "--repeticoes", str(args.repeticoes)], env=env, capture_output=True, text=True)
+        if p.returncode != 0:
+            sys.stderr.write(p.stderr)
+            raise SystemExit(f"falhou em {linhas} linhas")
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        resultado["tamanhos"].append({"linhas": linhas, **r})
+        imprimir(resultado["tamanhos"][-1])
+    saida = args.saida or os.path.join(RAIZ, "bench", "resultados", time.strftime("suite-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nresultado em {saida}")
+
+def imprimir(r):
+    print(f"\n{r['linhas']} linhas: {r['registros']} registros, {r['segmentos']} segmentos, "
+          f"{r['operadores']} operadores; operador medido {r['operador']} ({r['segmentos_operador']} segmentos)")
+    print(f"{'medida':<32} | {'s':>9} | {'pico MB':>8} | {'bytes':>10}")
+    for grupo in ("etapas", "callbacks"):
+        for nome, m in r[grupo].items():
+            pico = f"{m['pico_mb']:>8.1f}" if "pico_mb" in m else f"{'':>8}"
+            b = f"{m['bytes']:>10}" if "bytes" in m else f"{'':>10}"
+            print(f"{nome:<32} | {m['s']:>9.4f} | {pico} | {b}")
+    print(f"RSS máximo: {r['rss_max_mb']:.0f} MB")
+
+# ===================== COMPARAÇÃO =====================
+def comparar(antes, depois):
+    """Tabela tempo/pico/bytes de duas execuções, por tamanho e medida (razão = depois / antes)."""
+    with open(antes, encoding="utf-8") as f:
+        a = {t["linhas"]: t for t in json.load(f)["tamanhos"]}
+    with open(depois, encoding="utf-8") as f:
+        d = {t["linhas"]: t for t in json.load(f)["tamanhos"]}
+    def razao(x, y):
+        return f"{y / x:>6.2f}x" if x else f"{'':>7}"
+    for linhas in sorted(set(a) & set(d)):
+        print(f"\n{linhas} linhas")
+        print(f"{'medida':<32} | {'antes s':>9} | {'depois s':>9} | {'razão':>7} | {'pico':>7} | {'bytes':>7}")
+        for grupo in ("etapas", "callbacks"):
+            for nome in a[linhas][grupo]:
+                x, y = a[linhas][grupo][nome], d[linhas][grupo].get(nome)
+                if y is None:
+                    continue
+                print(f"{nome:<32} | {x['s']:>9.4f} | {y['s']:>9.4f} | {razao(x['s'], y['s'])} | "
+                      f"{razao(x.get('pico_mb'), y.get('pico_mb', 0))} | {razao(x.get('bytes'), y.get('bytes', 0))}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS)
+    ap.add_argument("--repeticoes", type=int, default=3)
+    ap.add_argument("--semente", type=int, default=0)
+    ap.add_argument("--formato", choices=["xlsx", "csv"], default="xlsx")
+    ap.add_argument("--operadores", type=int, help="fixo (padrão: cresce com as linhas, ~80 por operador-dia)")
+    ap.add_argument("--pasta", default=os.path.join(RAIZ, "bench", "dados"), help="planilhas geradas")
+    ap.add_argument("--saida", help="JSON do resultado (padrão: bench/resultados/suite-<data>.json)")
+    ap.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"))
+    ap.add_argument("--interno", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    elif args.interno:
+        print(json.dumps(rodar_tamanho(args.interno, args.repeticoes)))
+    else:
+        suite(args)
+
+if __name__ == "__main__":
+    main()
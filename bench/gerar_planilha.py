@@ -0,0 +1,171 @@
+"""
+Planilha sintética com as colunas do export ("Linha do tempo.xlsx").
+
+    python bench/gerar_planilha.py saida.xlsx [--linhas 100000] [--operadores N] [--equipamentos N]
+                                   [--dias 30] [--semente 0] [--sheet Plan1]
+
+Cada operador trabalha um turno por dia (diurno ou noturno; o noturno cruza a
+meia-noite → Hora Final < Hora Inicial), com apontamentos em sequência:
+- corridas da mesma operação no mesmo equipamento, coladas ou com intervalo
+  até GAP_MAX_MIN (agrupar_paradas junta) ou maior (não junta);
+- operações das regras (produtivas, improdutivas, auxiliares) + variações de
+  escrita (acento, caixa, espaços) e um FIM DE EXPEDIENTE no fim do turno;
+- sujeira rara do export: Nome vazio, Hora Final inválida.
+Sem --operadores/--equipamentos, escala com as linhas (~80 apontamentos por
+operador-dia). .csv na saída grava CSV (;) em vez de xlsx.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from segmentos import GAP_MAX_MIN  # noqa: E402
+
+# ===================== PARÂMETROS =====================
+COLUNAS = ["Nome","Código Equipamento","Descrição do Equipamento","Data Hora Local",
+           "Hora Inicial","Hora Final","Descrição da Operação","Descrição do Grupo da Operação"]
+APONTAMENTOS_POR_DIA = 80
+INICIO = "2025-01-01"
+# (grupo, operação, peso)
+OPERACOES = [
+    ("PRODUTIVA", "PLANTIO", 12), ("PRODUTIVA", "PULVERIZACAO", 12), ("PRODUTIVA", "COLHEITA", 10),
+    ("PRODUTIVA", "PREPARO DE SOLO", 6), ("PRODUTIVA", "ADUBACAO", 5),
+    ("IMPRODUTIVA", "AGUARDANDO ORDENS", 5), ("IMPRODUTIVA", "AGUARDANDO COMBUSTIVEL", 3),
+    ("IMPRODUTIVA", "FALTA DE INSUMOS", 2), ("IMPRODUTIVA", "AGUARDANDO MOVIMENTACAO PIVO", 1),
+    ("IMPRODUTIVA", "AGUARDANDO MECANICO", 3), ("IMPRODUTIVA", "TRATOR QUEBRADO", 2),
+    ("IMPRODUTIVA", "IMPLEMENTO QUEBRADO", 2), ("IMPRODUTIVA", "BORRACHARIA", 1),
+    ("IMPRODUTIVA", "MANUTENCAO MECANICA", 1), ("IMPRODUTIVA", "SEM SINAL GPS", 1),
+    ("IMPRODUTIVA", "REFEICAO", 3), ("IMPRODUTIVA", "REFEIÇÃO", 1), ("IMPRODUTIVA", "BANHEIRO", 2),
+    ("IMPRODUTIVA", "CHUVA", 2), ("IMPRODUTIVA", "OUTROS", 1), (" improdutiva ", "aguardando mecanico", 1),
+    ("AUXILIAR", "DESLOCAMENTO", 8), ("AUXILIAR", "MANOBRA", 6), ("AUXILIAR", "ABASTECIMENTO", 2),
+]
+FIM_EXPEDIENTE = ("AUXILIAR", "FIM DE EXPEDIENTE")
+MODELOS = ["TRATOR A", "TRATOR B", "PULVERIZADOR", "COLHEDORA", "PLANTADEIRA"]
+P_REPETE_OPERACAO = 0.4    # apontamento seguinte continua a mesma operação (corrida)
+P_TROCA_EQUIPAMENTO = 0.03
+P_TURNO_NOTURNO = 0.15
+P_NOME_VAZIO = 0.002
+P_HORA_INVALIDA = 0.001
+# intervalo antes do apontamento: colado / até GAP_MAX_MIN (junta) / longo
+P_INTERVALO = [0.7, 0.2, 0.1]
+
+# ===================== GERAÇÃO =====================
+HORAS = np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+
+def _textos(t):
+    """Segundos desde epoch → ("dd/mm/aaaa", "HH:MM:SS") por tabela (poucos dias distintos, 86.400 horas)."""
+    dia, seg = np.divmod(t, 86400)
+    cod, dias = pd.factorize(dia)
+    datas = pd.to_datetime(dias * 86400, unit="s").strftime("%d/%m/%Y").to_numpy(dtype=object)
+    return datas[cod], HORAS[seg]
+
+def _continua(rng, pos, p_repete):
+    """Índice do valor vigente: repete o anterior com prob. p_repete (nunca no 1º do turno)."""
+    idx = np.arange(len(pos))
+    idx[(rng.random(len(pos)) < p_repete) & (pos > 0)] = 0
+    return np.maximum.accumulate(idx)
+
+def gerar(linhas, operadores=None, equipamentos=None, dias=30, semente=0, inicio=INICIO):
+    """DataFrame com COLUNAS (textos como no export: datas dd/mm/aaaa, horas HH:MM:SS)."""
+    rng = np.random.default_rng(semente)
+    operadores = operadores or max(3, round(linhas / (dias * APONTAMENTOS_POR_DIA)))
+    equipamentos = equipamentos or max(2, operadores // 2)
+    n_od = operadores * dias
+    por_od = rng.multinomial(linhas, np.full(n_od, 1 / n_od))
+    od = np.repeat(np.arange(n_od), por_od)                          # operador-dia de cada linha
+    pos = np.arange(linhas) - np.repeat(np.cumsum(por_od) - por_od, por_od)
+    ultimo = pos == np.repeat(por_od, por_od) - 1
+
+    # turno: início (diurno 4–8h, noturno 16–20h) e duração 9–13h, em segundos
+    noturno = rng.random(n_od) < P_TURNO_NOTURNO
+    ini_turno = np.where(noturno, rng.uniform(16, 20, n_od), rng.uniform(4, 8, n_od)) * 3600
+    dur_turno = rng.uniform(9, 13, n_od) * 3600
+
+    # intervalos antes de cada apontamento e durações repartindo o resto do turno
+    tipo_int = rng.choice(3, size=linhas, p=P_INTERVALO)
+    intervalo = np.select([tipo_int == 1, tipo_int == 2],
+                          [rng.uniform(10, GAP_MAX_MIN * 60, linhas), rng.uniform(300, 2400, linhas)], 0.0)
+    intervalo[pos == 0] = 0.0
+    soma_int = np.bincount(od, intervalo, n_od)
+    escala_int = np.minimum(1.0, 0.3 * dur_turno / np.maximum(soma_int, 1.0))
+    intervalo *= escala_int[od]
+    peso = rng.exponential(1.0, linhas)
+    dur = peso / np.bincount(od, peso, n_od)[od] * (dur_turno - soma_int * escala_int)[od]
+    passo = intervalo + dur
+    acum = np.cumsum(passo) - np.repeat(np.cumsum(np.bincount(od, passo, n_od)) - np.bincount(od, passo, n_od), por_od)
+    base_s = pd.Timestamp(inicio).normalize().value // 10**9 + (od % dias) * 86400 + ini_turno[od]
+    data_ini, hora_ini = _textos(np.round(base_s + acum - dur).astype("int64"))
+    _, hora_fim = _textos(np.round(base_s + acum).astype("int64"))
+
+    # operações em corridas; último apontamento do turno = fim de expediente
+    pesos = np.array([p for _, _, p in OPERACOES], dtype=float)
+    op = rng.choice(len(OPERACOES), size=linhas, p=pesos / pesos.sum())[_continua(rng, pos, P_REPETE_OPERACAO)]
+    grupos = np.array([g for g, _, _ in OPERACOES] + [FIM_EXPEDIENTE[0]], dtype=object)
+    nomes_op = np.array([o for _, o, _ in OPERACOES] + [FIM_EXPEDIENTE[1]], dtype=object)
+    op = np.where(ultimo & (por_od[od] > 1), len(OPERACOES), op)
+
+    # equipamentos: cada operador usa 1–3 da frota e troca pouco
+    frota = rng.choice(equipamentos, size=(operadores, 3))
+    n_usa = rng.integers(1, 4, operadores)
+    operador = od // dias
+    escolha = rng.integers(0, 3, linhas) % n_usa[operador]
+    escolha = escolha[_continua(rng, pos, 1 - P_TROCA_EQUIPAMENTO)]
+    equip = frota[operador, escolha]
+    codigo = 100 + equip
+
+    nome = pd.Series([f"OPERADOR {i:04d}" for i in range(operadores)], dtype=object).to_numpy()[operador]
+    nome[rng.random(linhas) < P_NOME_VAZIO] = None
+    hora_fim[rng.random(linhas) < P_HORA_INVALIDA] = "xx"
+    return pd.DataFrame({
+        "Nome": nome,
+        "Código Equipamento": codigo,
+        "Descrição do Equipamento": np.array(MODELOS, dtype=object)[equip % len(MODELOS)],
+        "Data Hora Local": data_ini + " " + hora_ini,
+        "Hora Inicial": hora_ini,
+        "Hora Final": hora_fim,
+        "Descrição da Operação": nomes_op[op],
+        "Descrição do Grupo da Operação": grupos[op],
+    }, columns=COLUNAS)
+
+# ===================== GRAVAÇÃO =====================
+def gravar(df, caminho, sheet="Plan1", linhas_por_bloco=50_000):
+    """xlsx em modo write-only (linhas vão direto para o disco) ou CSV (;) pela extensão."""
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    if caminho.lower().endswith(".csv"):
+        df.to_csv(caminho, sep=";", index=False, encoding="utf-8")
+        return caminho
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+    ws.append(COLUNAS)
+    for i in range(0, len(df), linhas_por_bloco):
+        bloco = df.iloc[i:i + linhas_por_bloco].astype(object)
+        for linha in bloco.where(bloco.notna(), None).itertuples(index=False, name=None):
+            ws.append(linha)
+    wb.save(caminho)
+    return caminho
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("saida")
+    ap.add_argument("--linhas", type=int, default=100_000)
+    ap.add_argument("--operadores", type=int)
+    ap.add_argument("--equipamentos", type=int)
+    ap.add_argument("--dias", type=int, default=30)
+    ap.add_argument("--semente", type=int, default=0)
+    ap.add_argument("--sheet", default="Plan1")
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    df = gerar(args.linhas, args.operadores, args.equipamentos, args.dias, args.semente)
+    gravar(df, args.saida, args.sheet)
+    print(f"{len(df)} linhas, {df['Nome'].nunique()} operadores → {args.saida} ({time.perf_counter() - t:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# ===================== PARÂMETROS =====================
+# TIMELINE_CACHE:
+#   "memoria"            → LRU só no processo (padrão)
+#   "disco:<pasta>"      → pickles numa pasta compartilhada pelos workers
+#   "redis://host:6379"  → Redis local (precisa do pacote redis)
+CACHE_URL       = os.environ.get("TIMELINE_CACHE", "memoria")
+CACHE_MAX_ITENS = int(os.environ.get("TIMELINE_CACHE_MAX_ITENS", "64"))
+CACHE_MAX_MB    = float(os.environ.get("TIMELINE_CACHE_MAX_MB", "512"))
+CACHE_TTL_S     = int(os.environ.get("TIMELINE_CACHE_TTL_S", str(24 * 3600)))
+
+def chave(*partes):
+    return ":".join(str(p) for p in partes)
+
+def _tamanho(valor):
+    """
+    Estimativa de bytes: DataFrames/Series pelo memory_usage(deep=True), arrays/índices
+    pelo nbytes; o resto conta pouco. deep=True porque colunas object (texto
+    descategorizado) teriam só os ponteiros contados; categóricas contam as categorias
+    uma vez e texto Arrow já sai exato — o custo extra é só o das colunas object.
+    """
+    if hasattr(valor, "memory_usage"):
+        n = valor.memory_usage(index=True, deep=True)   # Series devolve o total direto
+        return int(n.sum() if hasattr(n, "sum") else n)
+    if hasattr(valor, "nbytes"):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sum(_tamanho(v) for v in valor.values()) + 64
+    if isinstance(valor, (list, tuple)):
+        return sum(_tamanho(v) for v in valor) + 64
+    return 64
+
+# ===================== BACKENDS =====================
+class CacheMemoria:
+    """LRU em memória, limitado por nº de itens e por bytes."""
+    def __init__(self, max_itens=CACHE_MAX_ITENS, max_mb=CACHE_MAX_MB):
+        self.max_itens = max_itens
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._dados = OrderedDict()   # chave → (valor, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, k):
+        with self._lock:
+            item = self._dados.get(k)
+            if item is None:
+                return None
+            self._dados.move_to_end(k)
+            return item[0]
+
+    def set(self, k, valor):
+        n = _tamanho(valor)
+        with self._lock:
+            if k in self._dados:
+                self._bytes -= self._dados.pop(k)[1]
+            self._dados[k] = (valor, n)
+            self._bytes += n
+            while self._dados and (len(self._dados) > self.max_itens or self._bytes > self.max_bytes):
+                if len(self._dados) == 1:   # nunca descarta o que acabou de entrar
+                    break
+                _, (_, m) = self._dados.popitem(last=False)
+                self._bytes -= m
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear(); self._bytes = 0
+
+class CacheDisco:
+    """Pickles numa pasta (compartilhada entre workers); LRU pelo mtime, limitado em bytes."""
+    def __init__(self, pasta, max_mb=CACHE_MAX_MB):
+        self.pasta = pasta
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(pasta, exist_ok=True)
+
+    def _arq(self, k):
+        return os.path.join(self.pasta, hashlib.sha1(k.encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, k):
+        arq = self._arq(k)
+        try:
+            with open(arq, "rb") as f:
+                chave_salva, valor = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if chave_salva != k:
+            return None
+        try:
+            os.utime(arq)   # marca uso recente
+        except OSError:
+            pass
+        return valor
+
+    def set(self, k, valor):
+        arq = self._arq(k)
+        tmp = f"{arq}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((k, valor), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, arq)
+        except OSError as e:
+            log.warning("cache em disco: falha ao gravar %s (%s)", arq, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._podar()
+
+    def _podar(self):
+        try:
+            arqs = [os.path.join(self.pasta, n) for n in os.listdir(self.pasta) if n.endswith(".pkl")]
+            stats = sorted(((os.stat(a), a) for a in arqs), key=lambda x: x[0].st_mtime)
+        except OSError:
+            return
+        total = sum(st.st_size for st, _ in stats)
+        for st, a in stats[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(a); total -= st.st_size
+            except OSError:
+                pass
+
+    def clear(self):
+        for n in os.listdir(self.pasta):
+            if n.endswith(".pkl"):
+                os.remove(os.path.join(self.pasta, n))
+
+class CacheRedis:
+    """Redis (ex.: instância local). Evicção fica a cargo do servidor (maxmemory-policy allkeys-lru) + TTL."""
+    def __init__(self, url, ttl_s=CACHE_TTL_S, prefixo="timeline:"):
+        import redis   # opcional
+        self._r = redis.Redis.from_url(url)
+        self.ttl_s = ttl_s
+        self.prefixo = prefixo
+
+    def get(self, k):
+        bruto = self._r.get(self.prefixo + k)
+        return pickle.loads(bruto) if bruto is not None else None
+
+    def set(self, k, valor):
+        self._r.set(self.prefixo + k, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), ex=self.ttl_s)
+
+    def clear(self):
+        for k in self._r.scan_iter(self.prefixo + "*"):
+            self._r.delete(k)
+
+class CacheEmCamadas:
+    """LRU local na frente de um backend compartilhado (disco/Redis)."""
+    def __init__(self, local, compartilhado):
+        self.local = local
+        self.compartilhado = compartilhado
+
+    def get(self, k):
+        v = self.local.get(k)
+        if v is None:
+            try:
+                v = self.compartilhado.get(k)
+            except Exception as e:   # backend fora do ar não derruba o callback
+                log.warning("cache compartilhado: get falhou (%s)", e)
+                return None
+            if v is not None:
+                self.local.set(k, v)
+        return v
+
+    def set(self, k, valor):
+        self.local.set(k, valor)
+        try:
+            self.compartilhado.set(k, valor)
+        except Exception as e:
+            log.warning("cache compartilhado: set falhou (%s)", e)
+
+    def clear(self):
+        self.local.clear(); self.compartilhado.clear()
+
+def criar_cache(url=CACHE_URL):
+    """Cria o cache a partir de TIMELINE_CACHE (backend indisponível → só memória)."""
+    local = CacheMemoria()
+    try:
+        if url.startswith("disco:"):
+            return CacheEmCamadas(local, CacheDisco(url[len("disco:"):] or ".cache"))
+        if url.startswith("redis://"):
+            return CacheEmCamadas(local, CacheRedis(url))
+    except (ImportError, OSError) as e:
+        log.warning("cache '%s' indisponível (%s); usando só memória", url, e)
+    return local
@@ -0,0 +1,444 @@
+import fcntl
+import fnmatch
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from ingestao import (PROCESSOS_INGESTAO, SNAPSHOT_DIR, VERSAO_SNAPSHOT, alinhar_categorias, carregar_base,
+                      carregar_fontes, concatenar, descategorizar, eh_csv, regras_atuais, versao_base)
+from metricas import medir
+from segmentos import (DIMENSOES_RESUMO, GAP_MAX_MIN, IndiceJanela, anexar_segmentos, montar_segmentos,
+                       resumo_diario)
+
+log = logging.getLogger(__name__)
+
+# ===================== PARÂMETROS =====================
+# TIMELINE_PASTA_EXPORTS: pasta com exports diários (*.xlsx na aba padrão, *.csv) somados ao ARQUIVO
+# TIMELINE_FONTES: padrões extras separados por ";" (ver FONTES abaixo)
+# TIMELINE_RECARGA_S: intervalo (s) do verificador de mudanças; 0 desliga a recarga
+PASTA_EXPORTS = os.environ.get("TIMELINE_PASTA_EXPORTS") or None
+FONTES_EXTRAS = [p.strip() for p in os.environ.get("TIMELINE_FONTES", "").split(";") if p.strip()]
+RECARGA_S     = float(os.environ.get("TIMELINE_RECARGA_S", "30"))
+# TIMELINE_BUFFERS: pasta (de preferência em /dev/shm) onde a base vira arquivos Arrow
+# mapeados em memória, compartilhados por todos os workers; vazio = cada processo com a sua
+PASTA_BUFFERS = os.environ.get("TIMELINE_BUFFERS") or None
+
+# ===================== FONTES =====================
+# Padrão de fonte: "glob[#aba]" — ex.: "fazendas/*/2025-*.xlsx#Plan*", "exports/*.csv".
+# Sem "#aba" vale a aba padrão (SHEET); aba aceita curingas; CSV não tem aba.
+# Id da fonte: "caminho#aba" (xlsx) ou "caminho" (csv).
+def _separar(id_fonte):
+    caminho, _, aba = id_fonte.rpartition("#")
+    return (caminho, aba) if caminho and not eh_csv(caminho) else (id_fonte, None)
+
+@lru_cache(maxsize=256)
+def _nomes_abas(caminho, tamanho, mtime_ns):
+    from openpyxl import load_workbook
+    wb = load_workbook(caminho, read_only=True)
+    try:
+        return tuple(wb.sheetnames)
+    finally:
+        wb.close()
+
+def _abas(caminho, padrao):
+    if not glob.has_magic(padrao):
+        return [padrao]
+    try:
+        st = os.stat(caminho)
+        return [a for a in _nomes_abas(caminho, st.st_size, st.st_mtime_ns) if fnmatch.fnmatchcase(a, padrao)]
+    except OSError:
+        return []
+
+def listar_fontes(padroes, sheet):
+    """Padrões → ids de fonte, em ordem (padrão, nome do arquivo, aba); ignora temporários do Excel."""
+    out = []
+    for padrao in padroes:
+        caminho_glob, abas = (padrao.rsplit("#", 1) + [sheet])[:2] if "#" in padrao else (padrao, sheet)
+        for caminho in sorted(glob.glob(caminho_glob)):
+            if os.path.basename(caminho).startswith("~$"):
+                continue
+            ids = [caminho] if eh_csv(caminho) else [f"{caminho}#{a}" for a in _abas(caminho, abas)]
+            out += [i for i in ids if i not in out]
+    return out
+
+def padroes_padrao(arquivo, pasta=PASTA_EXPORTS, extras=FONTES_EXTRAS):
+    """ARQUIVO (literal) + exports da pasta + TIMELINE_FONTES."""
+    out = [glob.escape(arquivo)]
+    if pasta:
+        out += [os.path.join(glob.escape(pasta), "*.xlsx"), os.path.join(glob.escape(pasta), "*.csv")]
+    return out + list(extras)
+
+def assinaturas(fontes):
+    """{id: (tamanho, mtime_ns)} do arquivo; fonte que sumiu no meio da leitura fica de fora."""
+    out = {}
+    for f in fontes:
+        try:
+            st = os.stat(_separar(f)[0])
+        except OSError:
+            continue
+        out[f] = (st.st_size, st.st_mtime_ns)
+    return out
+
+# ===================== VERSÃO DA BASE =====================
+# Registro repetido entre fontes (exports que se sobrepõem): vale o da 1ª fonte
+# na ordem; repetidos dentro da mesma fonte ficam (podem ser apontamentos legítimos).
+COLUNAS_REGISTRO = ["Nome","Equipamento","Descrição da Operação","Inicio","Fim"]
+
+class Dados:
+    """
+    Uma versão imutável da base: registros limpos + agrupado de todos os operadores.
+    - fontes: {id: (tamanho, mtime_ns)} na hora da leitura;
+    - partes: {id: (linha inicial, nº de linhas)} dentro de df (ordem das fontes, já sem repetidos);
+    - versao: muda com qualquer fonte, com as regras ou com o gap → chave de cache;
+    - operadores / nomes: partição por operador (ver particionar), montada junto;
+    - diario: horas por operador/equipamento × dia × tipo (resumo_diario), para a frota.
+    Nunca é alterada depois de criada; recarregar = criar outra e trocar a referência.
+    """
+    def __init__(self, df, segmentos, fontes, partes, versao, diario=None):
+        self.df = df
+        self.segmentos = segmentos
+        self.fontes = fontes
+        self.partes = partes
+        self.versao = versao
+        if diario is None:
+            with medir("resumo_diario"):
+                diario = resumo_diario(segmentos)
+        self.diario = diario
+        with medir("particao"):
+            self.operadores = particionar(df, segmentos)
+        self.nomes = sorted(self.operadores)
+
+def _versao(fontes, gap_max_min, snapshot_dir):
+    partes = "|".join(versao_base(*_separar(f), snapshot_dir) for f in fontes)
+    return f"{hashlib.sha1(partes.encode('utf-8')).hexdigest()[:12]}-g{gap_max_min}"
+
+def _chaves_registro(d):
+    return pd.util.hash_pandas_object(d[COLUNAS_REGISTRO], index=False).to_numpy()
+
+def _sem_repetidos(d, vistos):
+    """Tira de d os registros que já vieram de fontes anteriores (vistos = hashes delas)."""
+    if not vistos or d.empty:
+        return d
+    return d[~np.isin(_chaves_registro(d), np.concatenate(vistos))].reset_index(drop=True)
+
+def _juntar(blocos):
+    """[(id, df)] → df único + {id: (linha inicial, nº de linhas)}."""
+    partes, ini = {}, 0
+    for p, d in blocos:
+        partes[p] = (ini, len(d)); ini += len(d)
+    df = concatenar([d for _, d in blocos]) if blocos else pd.DataFrame()
+    return df, partes
+
+def _mesmas_linhas(a, b):
+    """equals sem depender das categorias de cada fonte (snapshot tem as suas; a base, a união)."""
+    if len(a) != len(b):
+        return False
+    a, b = alinhar_categorias([a, b])
+    return a.equals(b)
+
+def _montar(fontes, atual, snapshot_dir, processos):
+    """
+    Percorre as fontes em ordem tirando repetidos. Reaproveita a parte de `atual`
+    enquanto nada antes dela mudou; fontes novas/alteradas são lidas em paralelo
+    (carregar_fontes). Retorna (blocos, registros novos, só houve acréscimo?).
+    """
+    antigas = atual.fontes if atual else {}
+    mudaram = [f for f in fontes if antigas.get(f) != fontes[f]]
+    with medir("fontes"):
+        lidas = dict(zip(mudaram, carregar_fontes([_separar(f) for f in mudaram], snapshot_dir, processos)))
+
+    blocos, novos, vistos = [], [], []
+    # fonte removida: os repetidos que ela "segurava" voltam para as seguintes
+    so_acrescimo = set(antigas) <= set(fontes)
+    mudou = not so_acrescimo
+    ultima = list(fontes)[-1]
+    for f in fontes:
+        ini, n = atual.partes[f] if atual and f in atual.partes else (0, 0)
+        antigo = atual.df.iloc[ini:ini + n].reset_index(drop=True) if atual and f in atual.partes else None
+        if antigo is not None and not mudou and f not in lidas:
+            d = antigo
+        else:
+            bruto = lidas[f] if f in lidas else carregar_base(*_separar(f), snapshot_dir)
+            d = _sem_repetidos(bruto, vistos)
+            if antigo is None:
+                novos.append(d); mudou = True
+            elif len(d) >= n and _mesmas_linhas(d.iloc[:n], antigo):
+                novos.append(d.iloc[n:]); mudou |= len(d) > n
+            else:
+                so_acrescimo, mudou = False, True
+        if f != ultima:   # a última não tem ninguém depois para deduplicar
+            vistos.append(_chaves_registro(d))
+        blocos.append((f, d))
+    return blocos, novos, so_acrescimo
+
+def carregar_dados(padroes, sheet, gap_max_min=GAP_MAX_MIN, snapshot_dir=SNAPSHOT_DIR, processos=PROCESSOS_INGESTAO):
+    """Carga completa: lê todas as fontes (snapshot em disco / pool de processos) e agrupa tudo."""
+    fontes = assinaturas(listar_fontes(padroes, sheet))
+    if not fontes:
+        raise FileNotFoundError(f"nenhuma fonte encontrada em {padroes}")
+    df, partes = _juntar(_montar(fontes, None, snapshot_dir, processos)[0])
+    with medir("agrupamento"):
+        segmentos = montar_segmentos(df, gap_max_min)
+    return Dados(df, segmentos, fontes, partes,
+                 _versao(fontes, gap_max_min, snapshot_dir))
+
+def atualizar_dados(atual, padroes, sheet, gap_max_min=GAP_MAX_MIN, snapshot_dir=SNAPSHOT_DIR,
+                    processos=PROCESSOS_INGESTAO):
+    """
+    Nova versão a partir de `atual`, ou None se nenhuma fonte mudou.
+    Só as fontes novas/alteradas são relidas. Se tudo o que mudou foi acréscimo
+    (arquivo novo, ou linhas novas no fim de uma fonte), o agrupado é
+    atualizado só a partir dos registros novos (anexar_segmentos); fonte
+    removida ou linha antiga alterada → re-agrupa tudo.
+    """
+    fontes = assinaturas(listar_fontes(padroes, sheet))
+    if fontes == atual.fontes or not fontes:
+        return None
+    blocos, novos, so_acrescimo = _montar(fontes, atual, snapshot_dir, processos)
+    df, partes = _juntar(blocos)
+    with medir("agrupamento"):
+        if so_acrescimo:
+            segmentos = anexar_segmentos(atual.segmentos, df, concatenar(novos), gap_max_min)
+        else:
+            segmentos = montar_segmentos(df, gap_max_min)
+    return Dados(df, segmentos, fontes, partes, _versao(fontes, gap_max_min, snapshot_dir))
+
+# ===================== PARTIÇÃO POR OPERADOR =====================
+def _faixas(codigos):
+    """Códigos ordenados → (posições iniciais, finais) de cada sequência de valor igual."""
+    ini = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]]) if len(codigos) else np.zeros(0, dtype="int64")
+    return ini, np.r_[ini[1:], len(codigos)].astype("int64")
+
+def _distintos_por_nome(nomes, valores):
+    """
+    {nome: [valores distintos, ordenados]} com pares (nome, valor) únicos de uma
+    vez só; valores categóricos vão pelos códigos (categorias já em ordem).
+    """
+    cat = isinstance(valores.dtype, pd.CategoricalDtype)
+    pares = pd.DataFrame({"n": nomes.cat.codes.to_numpy(),
+                          "v": valores.cat.codes.to_numpy() if cat else valores.to_numpy()})
+    pares = (pares[(pares["n"] >= 0) & ((pares["v"] >= 0) if cat else pares["v"].notna())]
+             .drop_duplicates().sort_values(["n", "v"]))
+    n = pares["n"].to_numpy(); v = pares["v"].to_numpy()
+    if cat:
+        v = valores.cat.categories.to_numpy()[v]
+    ini, fim = _faixas(n)
+    return {nomes.cat.categories[n[i]]: v[i:f].tolist() for i, f in zip(ini, fim)}
+
+def particionar(df, segmentos):
+    """
+    {operador: {"fatia", "datas", "equipamentos", "tmin", "tmax"}} para os callbacks
+    não varrerem a base inteira a cada troca de operador:
+    - fatia: (início, fim) do operador em segmentos — já vem ordenado por
+      (Nome, Inicio), então cada operador é uma faixa contínua (iloc, sem filtro);
+    - datas: dias com registro (date, ordenados); equipamentos: os do agrupado;
+    - tmin/tmax: 1º Inicio e maior Fim do agrupado (None sem segmentos).
+    Operador só com "fim de expediente" tem datas mas fatia vazia.
+    """
+    dias = pd.Series(df["Inicio"].to_numpy().astype("datetime64[D]").astype("int64"))   # dias desde epoch
+    datas = {n: np.array(d, dtype="datetime64[D]").tolist()
+             for n, d in _distintos_por_nome(df["Nome"], dias).items()}
+    out = {nome: {"fatia": (0, 0), "datas": d, "equipamentos": [], "tmin": None, "tmax": None}
+           for nome, d in datas.items()}
+    if segmentos.empty:
+        return out
+    nomes = segmentos["Nome"]
+    equips = _distintos_por_nome(nomes, segmentos["Equipamento"])
+    ini, fim = _faixas(nomes.cat.codes.to_numpy())
+    t_ini = segmentos["Inicio"].to_numpy()[ini]
+    t_fim = np.maximum.reduceat(segmentos["Fim"].to_numpy(), ini)
+    for i, f, a, b in zip(ini, fim, t_ini, t_fim):
+        nome = nomes.cat.categories[nomes.cat.codes.iat[i]]
+        out[nome].update(fatia=(int(i), int(f)), equipamentos=equips.get(nome, []),
+                         tmin=pd.Timestamp(a), tmax=pd.Timestamp(b))
+    return out
+
+def preparar_operador(dados, operador):
+    """
+    Agrupado de um operador pronto para consultas de janela, ou None sem segmentos:
+    {"dff", "tmin", "tmax", "equip_all", "indice"}. Já sem "fim/final de expediente"
+    (montar_segmentos na carga); só a faixa do operador volta a texto.
+    """
+    part = dados.operadores.get(operador)
+    if part is None or part["fatia"][0] == part["fatia"][1]:
+        return None
+    dff = descategorizar(dados.segmentos.iloc[slice(*part["fatia"])]).reset_index(drop=True)
+    return {
+        "dff": dff,
+        "tmin": part["tmin"],
+        "tmax": part["tmax"],
+        "equip_all": part["equipamentos"],
+        "indice": IndiceJanela(dff),
+    }
+
+# ===================== MEMÓRIA COMPARTILHADA =====================
+# Uma pasta por conjunto de fontes (chave = assinaturas + sheet + gap + regras):
+#   base.arrow, segmentos.arrow, diario_<dimensão>.arrow (Arrow IPC, 1 bloco por coluna) + meta.json.
+# Quem chega lê com memory_map: datas e números viram colunas do pandas
+# apontando para as páginas do arquivo, sem cópia — todos os workers dividem as
+# mesmas páginas. Categóricas vão como dicionário do Arrow: a tabela de valores
+# é pequena e os códigos (int8/int16) custam 1-2 bytes por linha em cada processo.
+FORMATO_BUFFERS = 2   # mude quando mudarem os arquivos exportados (2: + diario_*)
+
+def _chave_fontes(fontes, sheet, gap_max_min):
+    partes = [sorted((os.path.abspath(p), *a) for p, a in fontes.items()),
+              sheet, gap_max_min, VERSAO_SNAPSHOT, FORMATO_BUFFERS, regras_atuais()[1]]
+    return hashlib.sha1(json.dumps(partes).encode("utf-8")).hexdigest()[:16]
+
+@contextmanager
+def _trava(pasta):
+    """Trava entre processos (um monta e exporta; os outros esperam e anexam)."""
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, ".trava"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _para_arrow(df):
+    import pyarrow as pa
+    # NaN de float fica como valor (não vira nulo) → volta sem cópia
+    cols = [pa.array(df[c].to_numpy(), from_pandas=False) if df[c].dtype.kind in "biuf" else pa.array(df[c])
+            for c in df.columns]
+    return pa.table(cols, names=[str(c) for c in df.columns])
+
+def _gravar_arrow(df, caminho):
+    import pyarrow as pa
+    t = _para_arrow(df)
+    with pa.OSFile(caminho, "wb") as f, pa.ipc.new_file(f, t.schema) as w:
+        w.write_table(t, max_chunksize=max(len(df), 1))
+
+def _ler_arrow(caminho):
+    import pyarrow as pa
+    t = pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+    return t.to_pandas(split_blocks=True, self_destruct=False)
+
+def exportar_buffers(dados, pasta, sheet, gap_max_min):
+    """Grava a versão em pasta/<chave>/ (troca atômica do diretório) e apaga as antigas."""
+    chave = _chave_fontes(dados.fontes, sheet, gap_max_min)
+    destino = os.path.join(pasta, chave)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        _gravar_arrow(dados.df, os.path.join(tmp, "base.arrow"))
+        _gravar_arrow(dados.segmentos, os.path.join(tmp, "segmentos.arrow"))
+        for dim in DIMENSOES_RESUMO:
+            _gravar_arrow(dados.diario[dim], os.path.join(tmp, f"diario_{dim.lower()}.arrow"))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"versao": dados.versao, "fontes": dados.fontes, "partes": dados.partes}, f)
+        if not os.path.exists(destino):
+            os.rename(tmp, destino)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    # quem ainda está com a versão velha mapeada continua lendo (unlink não derruba o mmap)
+    for nome in os.listdir(pasta):
+        if nome != chave and not nome.startswith("."):
+            shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+    return chave
+
+def anexar_buffers(pasta, chave):
+    """Dados mapeados de pasta/<chave>/, ou None se essa versão ainda não foi exportada."""
+    origem = os.path.join(pasta, chave)
+    try:
+        with open(os.path.join(origem, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return Dados(_ler_arrow(os.path.join(origem, "base.arrow")),
+                 _ler_arrow(os.path.join(origem, "segmentos.arrow")),
+                 {p: tuple(a) for p, a in meta["fontes"].items()},
+                 {p: tuple(a) for p, a in meta["partes"].items()},
+                 meta["versao"],
+                 {dim: _ler_arrow(os.path.join(origem, f"diario_{dim.lower()}.arrow")) for dim in DIMENSOES_RESUMO})
+
+# ===================== RECARGA EM SEGUNDO PLANO =====================
+class Recarregador:
+    """
+    Mantém a versão atual da base e troca por uma nova quando as fontes mudam.
+    - a verificação (só os.stat) e a reconstrução rodam numa thread própria,
+      fora do caminho das requisições;
+    - a troca é uma atribuição de referência: quem já pegou `atual` segue com a
+      versão antiga até terminar; o próximo callback vê a nova inteira;
+    - a thread só sobe quando o processo chama iniciar() — em app.py, na 1ª
+      requisição de cada worker. O master do gunicorn (preload) importa o app
+      mas não atende requisições: fica passivo, sem vigiar nem remontar a base
+      na memória dele nem segurar a trava dos buffers na hora do fork.
+    Com pasta_buffers, só um processo monta cada versão; os demais anexam os
+    buffers já exportados (worker novo sobe sem reler nem re-agrupar nada).
+    """
+    def __init__(self, padroes, sheet, gap_max_min=GAP_MAX_MIN, intervalo_s=RECARGA_S,
+                 snapshot_dir=SNAPSHOT_DIR, pasta_buffers=PASTA_BUFFERS):
+        self.padroes, self.sheet = list(padroes), sheet
+        self.gap_max_min, self.intervalo_s, self.snapshot_dir = gap_max_min, intervalo_s, snapshot_dir
+        self.pasta_buffers = pasta_buffers
+        self._atual = self._compartilhado(
+            lambda: carregar_dados(self.padroes, sheet, gap_max_min, snapshot_dir), primeira=True)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def atual(self):
+        return self._atual
+
+    def iniciar(self):
+        """Sobe a thread de recarga deste processo (uma vez por pid; nada se intervalo_s <= 0)."""
+        if self.intervalo_s <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._laco, name="recarga-base", daemon=True).start()
+
+    def _compartilhado(self, montar, primeira=False):
+        """Sem buffers: montar(). Com buffers: anexa a versão das fontes atuais ou monta e exporta."""
+        if not self.pasta_buffers:
+            return montar()
+        with _trava(self.pasta_buffers):
+            fontes = assinaturas(listar_fontes(self.padroes, self.sheet))
+            if not primeira and (fontes == self._atual.fontes or not fontes):
+                return None
+            with medir("anexar_buffers"):
+                d = anexar_buffers(self.pasta_buffers, _chave_fontes(fontes, self.sheet, self.gap_max_min))
+            if d is None:
+                novo = montar()
+                if novo is None:
+                    return None
+                with medir("exportar_buffers"):
+                    chave = exportar_buffers(novo, self.pasta_buffers, self.sheet, self.gap_max_min)
+                    d = anexar_buffers(self.pasta_buffers, chave)   # o próprio processo também usa o mapeado
+        return d
+
+    def verificar(self):
+        """Uma rodada de verificação; devolve True se trocou de versão."""
+        inicio = time.perf_counter()
+        # leitura sequencial: este processo já tem outras threads (servidor, amostrador)
+        # e um fork agora pode deixar o filho preso numa trava que uma delas segurava
+        novo = self._compartilhado(lambda: atualizar_dados(self._atual, self.padroes, self.sheet,
+                                                           self.gap_max_min, self.snapshot_dir, processos=1))
+        if novo is None:
+            return False
+        antigo, self._atual = self._atual, novo
+        log.info("base recarregada: %s → %s (%d registros, %d segmentos, %.1fs)",
+                 antigo.versao, novo.versao, len(novo.df), len(novo.segmentos), time.perf_counter() - inicio)
+        return True
+
+    def _laco(self):
+        while True:
+            time.sleep(self.intervalo_s)
+            try:
+                self.verificar()
+            except Exception:   # arquivo meio gravado, planilha aberta etc. → tenta na próxima
+                log.exception("recarga da base falhou; mantendo versão %s", self._atual.versao)
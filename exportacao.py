@@ -0,0 +1,137 @@
+"""
+Exportação dos segmentos agrupados e das paradas totalizadas, de um operador
+numa janela ou de todos os operadores num período, em CSV ou XLSX.
+
+Os dados saem em blocos, um por operador (faixa da partição): o CSV vai para a
+resposta bloco a bloco; o XLSX é escrito pelo openpyxl em modo write-only num
+arquivo temporário (as linhas vão para o disco, não para a memória) e depois
+lido em pedaços. Nenhum dos dois monta a tabela inteira no worker.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from dados import preparar_operador
+from ingestao import descategorizar
+from segmentos import US_POR_MIN, filtrar_janela, para_us
+
+# ===================== PARÂMETROS =====================
+CONTEUDOS = {"segmentos": "Segmentos", "paradas": "Paradas"}
+FORMATOS = {"csv": "text/csv; charset=utf-8",
+            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+COLUNAS = {
+    "segmentos": ["Operador","Equipamento","Tipo Parada","Operação","Início","Fim",
+                  "Duração (min)","Minutos no período"],
+    "paradas":   ["Operador","Equipamento","Tipo Parada","Operação","Início","Fim",
+                  "Minutos","Ocorrências"],
+}
+SEPARADOR_CSV = ";"                # com vírgula decimal: o Excel em pt-BR abre direto
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+LINHAS_POR_ABA_XLSX = 1_000_000   # limite do Excel é 1.048.576; passa disso → aba _2, _3...
+BYTES_POR_PEDACO = 1 << 20
+
+# ===================== BLOCOS =====================
+# Mesmas regras da tela: sem máquinas escolhidas = todas as do operador
+# (apontamento sem equipamento fica de fora, como em filtrar_janela).
+def blocos_segmentos(dados, operadores, x0, x1, equips=None):
+    """Por operador: segmentos que cruzam [x0, x1), com os minutos recortados no período."""
+    a, b = int(para_us(pd.Timestamp(x0).to_datetime64())), int(para_us(pd.Timestamp(x1).to_datetime64()))
+    for operador in operadores:
+        part = dados.operadores.get(operador)
+        if part is None:
+            continue
+        seg = dados.segmentos.iloc[slice(*part["fatia"])]
+        ini = para_us(seg["Inicio"].to_numpy()); fim = para_us(seg["Fim"].to_numpy())
+        sel = (fim > a) & (ini < b) & seg["Equipamento"].isin(equips or part["equipamentos"]).to_numpy()
+        if not sel.any():
+            continue
+        seg = descategorizar(seg[sel])
+        recorte = (np.minimum(fim[sel], b) - np.maximum(ini[sel], a)) / US_POR_MIN
+        yield pd.DataFrame({
+            "Operador": seg["Nome"], "Equipamento": seg["Equipamento"], "Tipo Parada": seg["Tipo Parada"],
+            "Operação": seg["Descrição da Operação"], "Início": seg["Inicio"], "Fim": seg["Fim"],
+            "Duração (min)": seg["Duracao Min"].round(2), "Minutos no período": recorte.round(2),
+        })
+
+def blocos_paradas(dados, operadores, x0, x1, equips=None):
+    """Por operador: totais por (Equipamento, Tipo Parada, Operação) em [x0, x1) — a consulta dos cards/tabelas."""
+    for operador in operadores:
+        prep = preparar_operador(dados, operador)
+        if prep is None:
+            continue
+        win = filtrar_janela(prep["indice"].consulta(x0, x1), equips or prep["equip_all"])
+        if win.empty:
+            continue
+        win = win.sort_values(["Equipamento","Tipo Parada","Duracao Us"], ascending=[True, True, False], kind="stable")
+        yield pd.DataFrame({
+            "Operador": operador, "Equipamento": win["Equipamento"], "Tipo Parada": win["Tipo Parada"],
+            "Operação": win["Descrição da Operação"], "Início": win["Inicio"], "Fim": win["Fim"],
+            "Minutos": win["Duracao Min Clip"].round(2), "Ocorrências": win["Ocorrências"],
+        })
+
+BLOCOS = {"segmentos": blocos_segmentos, "paradas": blocos_paradas}
+
+# ===================== FORMATOS =====================
+def csv_em_pedacos(blocos, colunas):
+    """Bytes do CSV (utf-8 com BOM, ; e vírgula decimal), um pedaço por bloco; cabeçalho mesmo sem linhas."""
+    yield ("\ufeff" + SEPARADOR_CSV.join(colunas) + "\r\n").encode("utf-8")
+    for bloco in blocos:
+        yield bloco[colunas].to_csv(sep=SEPARADOR_CSV, decimal=",", index=False, header=False,
+                                    date_format=FORMATO_DATA, lineterminator="\r\n").encode("utf-8")
+
+def gravar_xlsx_temporario(blocos, colunas, aba):
+    """Blocos → xlsx temporário (openpyxl write-only). Retorna o caminho; PedacosDoArquivo apaga."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws, n, abas = None, LINHAS_POR_ABA_XLSX, 0
+    for bloco in blocos:
+        bloco = bloco[colunas].astype(object)
+        for linha in bloco.where(bloco.notna(), None).itertuples(index=False, name=None):
+            if n >= LINHAS_POR_ABA_XLSX:
+                abas += 1; n = 0
+                ws = wb.create_sheet(aba if abas == 1 else f"{aba}_{abas}")
+                ws.append(colunas)
+            ws.append(linha); n += 1
+    if ws is None:
+        wb.create_sheet(aba).append(colunas)
+    fd, caminho = tempfile.mkstemp(prefix="exportacao-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(caminho)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return caminho
+
+class PedacosDoArquivo:
+    """
+    Pedaços de BYTES_POR_PEDACO de um arquivo temporário. O arquivo é aberto e já
+    apagado do diretório aqui (o descritor aberto segura o conteúdo), então nada
+    fica no disco mesmo que a resposta seja fechada antes do primeiro pedaço —
+    caso em que o finally de um gerador nunca rodaria. close() libera o descritor.
+    """
+    def __init__(self, caminho):
+        try:
+            self._f = open(caminho, "rb")
+        finally:
+            os.remove(caminho)
+
+    def __iter__(self):
+        while not self._f.closed and (pedaco := self._f.read(BYTES_POR_PEDACO)):
+            yield pedaco
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+def exportar(dados, conteudo, formato, operadores, x0, x1, equips=None):
+    """
+    Iterável de bytes do arquivo pedido (conteudo em CONTEUDOS, formato em FORMATOS),
+    com close(). O XLSX é gravado antes do primeiro pedaço (o zip só fecha no fim).
+    """
+    blocos = BLOCOS[conteudo](dados, operadores, x0, x1, equips)
+    if formato == "csv":
+        return csv_em_pedacos(blocos, COLUNAS[conteudo])
+    return PedacosDoArquivo(gravar_xlsx_temporario(blocos, COLUNAS[conteudo], CONTEUDOS[conteudo]))
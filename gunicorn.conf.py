@@ -0,0 +1,21 @@
+import os
+import shutil
+
+# Modo preload: o master importa app.py uma vez (carga + agrupamento) e exporta a
+# base para buffers Arrow em TIMELINE_BUFFERS; os workers herdam o mapeamento
+# (ou anexam os mesmos buffers ao renascer), sem cópia própria dos dados.
+# Uso: gunicorn -c gunicorn.conf.py
+os.environ.setdefault("TIMELINE_BUFFERS", "/dev/shm/linha_tempo" if os.path.isdir("/dev/shm") else ".buffers")
+# Métricas: cada worker grava as suas em TIMELINE_METRICAS_DIR e o /metrics soma
+# todas (ver metricas.py); a pasta é limpa quando o servidor sobe.
+os.environ.setdefault("TIMELINE_METRICAS_DIR", "/dev/shm/linha_tempo_metricas" if os.path.isdir("/dev/shm") else ".metricas")
+
+wsgi_app     = "app:server"
+preload_app  = True
+bind         = os.environ.get("TIMELINE_BIND", "0.0.0.0:8050")
+workers      = int(os.environ.get("TIMELINE_WORKERS", "4"))
+timeout      = 120
+
+def on_starting(server):
+    # depois do preload: as medições da carga feita aqui são gravadas antes do fork dos workers
+    shutil.rmtree(os.environ["TIMELINE_METRICAS_DIR"], ignore_errors=True)
@@ -0,0 +1,449 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metricas import estado, incorporar, medir, zerar
+
+log = logging.getLogger(__name__)
+
+# ===================== PARÂMETROS =====================
+# Snapshot da base limpa (evita reler o xlsx a cada worker).
+# Mude VERSAO_SNAPSHOT sempre que a limpeza mudar (a tabela de regras já entra na chave).
+SNAPSHOT_DIR    = os.environ.get("TIMELINE_SNAPSHOT_DIR", ".snapshot")
+VERSAO_SNAPSHOT = 3
+# Leitura em blocos de N linhas (não monta a planilha inteira como lista de listas)
+# e até N processos lendo fontes diferentes ao mesmo tempo
+LINHAS_POR_BLOCO   = int(os.environ.get("TIMELINE_LINHAS_POR_BLOCO", "50000"))
+PROCESSOS_INGESTAO = int(os.environ.get("TIMELINE_INGESTAO_PROCESSOS", str(os.cpu_count() or 1)))
+
+# ===================== CLASSIFICAÇÃO =====================
+# Tabela declarativa (grupo, operacao, tipo); "*" = qualquer valor.
+# Precedência: (grupo, operacao) > (grupo, *) > (*, operacao) > (*, *).
+ARQUIVO_REGRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regras_paradas.csv")
+CORINGA = "*"
+
+def _norm(v):
+    return str(v).strip().upper()
+
+def carregar_regras(caminho=ARQUIVO_REGRAS):
+    """Lê a tabela de regras → {(GRUPO, OPERACAO): tipo} (chaves normalizadas)."""
+    r = pd.read_csv(caminho, dtype=str, keep_default_na=False, encoding="utf-8")
+    regras = {}
+    for g, o, t in zip(r["grupo"], r["operacao"], r["tipo"]):
+        regras.setdefault((_norm(g), _norm(o)), t.strip())
+    return regras
+
+# Tabela em uso: (tamanho/mtime, regras, sha256 dos bytes lidos). Editar o CSV com
+# o app no ar vale a partir da próxima leitura de fonte; o sha que vai para os
+# manifestos/buffers é sempre o das regras que classificaram as linhas.
+_REGRAS_EM_USO = (None, None, None)
+
+def regras_atuais(caminho=ARQUIVO_REGRAS):
+    """(regras, sha256) da tabela; relê (parse + hash dos mesmos bytes) quando o arquivo muda."""
+    global _REGRAS_EM_USO, REGRAS
+    st = os.stat(caminho)
+    assinatura, regras, sha = _REGRAS_EM_USO
+    if assinatura != (st.st_size, st.st_mtime_ns):
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        regras, sha = carregar_regras(io.BytesIO(conteudo)), hashlib.sha256(conteudo).hexdigest()
+        _REGRAS_EM_USO = ((st.st_size, st.st_mtime_ns), regras, sha)
+        REGRAS = regras
+    return regras, sha
+
+REGRAS = regras_atuais()[0]
+
+def _tipo_por_regra(grupo, desc, regras):
+    for chave in ((grupo, desc), (grupo, CORINGA), (CORINGA, desc), (CORINGA, CORINGA)):
+        if chave in regras:
+            return regras[chave]
+    return "Outro"
+
+def classificar(grupos, operacoes, regras=None):
+    """
+    Tipo Parada de cada apontamento pela tabela de regras (ver _tipo_por_regra).
+    Fatoriza grupo/operação, normaliza só os valores únicos e resolve a regra
+    uma vez por par (grupo, operação) distinto; o resto é indexação em array.
+    """
+    regras = regras_atuais()[0] if regras is None else regras
+    g_cod, g_uni = pd.factorize(grupos, use_na_sentinel=False)
+    o_cod, o_uni = pd.factorize(operacoes, use_na_sentinel=False)
+    n_o = max(len(o_uni), 1)
+    par_cod, par_uni = pd.factorize(g_cod.astype("int64") * n_o + o_cod)
+    g_norm = [_norm(v) for v in g_uni]
+    o_norm = [_norm(v) for v in o_uni]
+    tabela = np.array([_tipo_por_regra(g_norm[p // n_o], o_norm[p % n_o], regras) for p in par_uni], dtype=object)
+    return pd.Series(tabela[par_cod], index=getattr(grupos, "index", None), name="Tipo Parada")
+
+# ===================== CARGA & LIMPEZA =====================
+def _to_datetime_unicos(s, **kw):
+    """pd.to_datetime só sobre os valores distintos (horas/datas se repetem muito)."""
+    cod, uni = pd.factorize(s, use_na_sentinel=False)
+    conv = pd.to_datetime(pd.Series(uni, dtype=object), **kw)
+    return pd.Series(conv.to_numpy()[cod], index=s.index, name=s.name)
+
+def _hora_para_timedelta(hora):
+    """'HH:MM:SS' → timedelta desde 00:00; inválidos viram NaT."""
+    h = _to_datetime_unicos(hora, format="%H:%M:%S", errors="coerce")
+    return h - h.dt.normalize()
+
+def limpar_base(df, regras=None):
+    """Base bruta (colunas da planilha) → base limpa (Equipamento, Inicio, Fim, Tipo Parada)."""
+    df = df.copy()
+
+    # Equipamento (string amigável)
+    df["Equipamento"] = df["Código Equipamento"].astype(str) + " - " + df["Descrição do Equipamento"]
+
+    # Parsing
+    # (Hora Inicial/Final ficam como texto: só os timedeltas seguem para Inicio/Fim)
+    td_ini = _hora_para_timedelta(df["Hora Inicial"])
+    td_fim = _hora_para_timedelta(df["Hora Final"])
+    df["Data Hora Local"] = _to_datetime_unicos(df["Data Hora Local"], dayfirst=True, errors="coerce")
+    ok = df["Nome"].notna() & td_ini.notna() & td_fim.notna() & df["Data Hora Local"].notna()
+    df, td_ini, td_fim = df[ok].copy(), td_ini[ok], td_fim[ok]
+
+    # Instantes absolutos: dia da "Data Hora Local" + hora do apontamento
+    dia = df["Data Hora Local"].dt.normalize()
+    df["Inicio"] = dia + td_ini
+    df["Fim"]    = dia + td_fim
+
+    # Cruza meia-noite? soma 1 dia no Fim
+    mask_cross = df["Fim"] < df["Inicio"]
+    df.loc[mask_cross, "Fim"] = df.loc[mask_cross, "Fim"] + pd.Timedelta(days=1)
+
+    df["Tipo Parada"] = classificar(df["Descrição do Grupo da Operação"], df["Descrição da Operação"], regras)
+    return df.reset_index(drop=True)
+
+# ===================== REPRESENTAÇÃO COMPACTA =====================
+# O que fica residente: textos repetidos como categóricas (código int8/int16 por
+# linha + tabela de valores; categorias em ordem alfabética, então ordenar e
+# agrupar dão o mesmo resultado que com texto, e == / isin comparam códigos)
+# e Inicio/Fim em datetime64 (int64 desde epoch). Hora Inicial/Final (texto
+# original), Data Hora Local (mesmo dia do Inicio) e as colunas de origem do
+# Equipamento não são usadas depois da limpeza.
+COLUNAS_CATEGORICAS = ["Nome","Equipamento","Descrição da Operação","Descrição do Grupo da Operação","Tipo Parada"]
+COLUNAS_BASE = COLUNAS_CATEGORICAS + ["Inicio","Fim"]
+
+def _eh_categorica(s):
+    return isinstance(s.dtype, pd.CategoricalDtype)
+
+def base_vazia():
+    """Base compacta sem registros (fonte vazia), com os tipos de uma base lida."""
+    cols = {c: pd.Series(pd.Categorical([], categories=pd.Index([], dtype="str"))) for c in COLUNAS_CATEGORICAS}
+    cols.update({c: pd.Series([], dtype="datetime64[us]") for c in ["Inicio", "Fim"]})
+    return pd.DataFrame(cols, columns=COLUNAS_BASE)
+
+def compactar(df):
+    """Base limpa → só COLUNAS_BASE, textos como categóricas."""
+    out = df[COLUNAS_BASE].copy()
+    for c in COLUNAS_CATEGORICAS:
+        out[c] = out[c].astype("category")
+    return out
+
+def alinhar_categorias(frames):
+    """
+    Mesmas categorias (união ordenada) nas colunas categóricas de todos os frames.
+    Sem isso, concat de categóricas diferentes cai para object e equals dá False.
+    """
+    frames = list(frames)
+    cols = [c for c in frames[0].columns if _eh_categorica(frames[0][c])] if frames else []
+    for c in cols:
+        if all(f[c].dtype == frames[0][c].dtype for f in frames):
+            continue
+        cats = frames[0][c].cat.categories
+        for f in frames[1:]:
+            cats = cats.union(f[c].cat.categories if _eh_categorica(f[c]) else pd.Index(f[c].dropna().unique()))
+        tipo = pd.CategoricalDtype(cats)
+        frames = [f.assign(**{c: f[c].astype(tipo)}) for f in frames]
+    return frames
+
+def concatenar(frames):
+    """pd.concat(ignore_index=True) que preserva as categóricas."""
+    return pd.concat(alinhar_categorias(frames), ignore_index=True)
+
+def descategorizar(df):
+    """Categóricas → valores (fatias pequenas que seguem para texto, plotly, tabelas)."""
+    cols = {}
+    for c in df.columns:
+        if _eh_categorica(df[c]):
+            tipo = df[c].cat.categories.dtype
+            cols[c] = df[c].astype(object if tipo.kind in "biu" else tipo)
+    return df.assign(**cols) if cols else df
+
+def relatorio_memoria(antes, depois):
+    """Bytes por coluna (deep) antes/depois de compactar; coluna descartada fica com 0 depois."""
+    r = pd.DataFrame({"antes": antes.memory_usage(index=False, deep=True),
+                      "depois": depois.memory_usage(index=False, deep=True)})
+    r = r.reindex(list(antes.columns) + [c for c in depois.columns if c not in antes.columns]).fillna(0).astype("int64")
+    r.loc["TOTAL"] = r.sum()
+    r["fator"] = (r["antes"] / r["depois"].where(r["depois"] > 0)).round(1)
+    return r
+
+# ===================== LEITURA EM BLOCOS =====================
+def eh_csv(arquivo):
+    return arquivo.lower().endswith(".csv")
+
+def _valor_celula(c):
+    """Mesma conversão do pd.read_excel (openpyxl): vazio → "", erro → NaN, número inteiro → int."""
+    if c.value is None:
+        return ""
+    if c.data_type == "e":
+        return np.nan
+    if c.data_type == "n":
+        v = int(c.value)
+        return v if v == c.value else float(c.value)
+    return c.value
+
+def _linha(row):
+    v = [_valor_celula(c) for c in row]
+    while v and v[-1] == "":
+        v.pop()
+    return v
+
+def _parse_bloco(cab, linhas):
+    """Lista de linhas → DataFrame com a mesma inferência de tipos do read_excel."""
+    from pandas.io.parsers import TextParser
+    largura = max([len(cab)] + [len(l) for l in linhas])
+    dados = [l + [""] * (largura - len(l)) for l in [cab] + linhas]
+    return TextParser(dados, header=0, skip_blank_lines=False).read()
+
+def _blocos_xlsx(arquivo, sheet, linhas_por_bloco):
+    from openpyxl import load_workbook
+    wb = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb[sheet]
+        ws.reset_dimensions()
+        linhas = ws.iter_rows()
+        cab = _linha(next(linhas, ()))
+        buf, blocos = [], 0
+        for row in linhas:
+            buf.append(_linha(row))
+            if len(buf) >= linhas_por_bloco:
+                yield _parse_bloco(cab, buf); buf = []; blocos += 1
+        if buf or not blocos:   # aba só com cabeçalho → um bloco vazio com as colunas
+            yield _parse_bloco(cab, buf)
+    finally:
+        wb.close()
+
+def _blocos_csv(arquivo, linhas_por_bloco):
+    """CSV exportado (utf-8 ou latin-1; separador ; , tab ou | detectado na 1ª linha)."""
+    with open(arquivo, "rb") as f:
+        cab = f.readline()
+    try:
+        encoding = "utf-8-sig"; texto = cab.decode(encoding)
+    except UnicodeDecodeError:
+        encoding = "latin-1"; texto = cab.decode(encoding)
+    sep = csv.Sniffer().sniff(texto, delimiters=";,\t|").delimiter
+    yield from pd.read_csv(arquivo, sep=sep, encoding=encoding, chunksize=linhas_por_bloco)
+
+def _unificar_tipos(df):
+    """
+    Blocos inferidos separadamente podem discordar (ex.: coluna de texto vazia
+    num bloco vira float NaN e o concat dá object). Refaz a inferência nessas
+    colunas para ficar com o tipo que a leitura do arquivo inteiro daria.
+    """
+    for c in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[c], skipna=True) in ("string", "integer", "floating",
+                                                             "mixed-integer-float", "datetime"):
+            df[c] = pd.Series(df[c].tolist(), index=df.index, name=c)
+    return df
+
+def ler_bruta(arquivo, sheet, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Lê a fonte em blocos (xlsx read-only ou csv) → colunas da planilha, como o read_excel daria."""
+    if eh_csv(arquivo):
+        blocos = list(_blocos_csv(arquivo, linhas_por_bloco))
+    else:
+        blocos = list(_blocos_xlsx(arquivo, sheet, linhas_por_bloco))
+    return _unificar_tipos(pd.concat(blocos, ignore_index=True))
+
+def ler_planilha(arquivo, sheet, linhas_por_bloco=LINHAS_POR_BLOCO, regras=None):
+    """Fonte → base limpa e compacta."""
+    with medir("leitura"):
+        bruta = ler_bruta(arquivo, sheet, linhas_por_bloco)
+    if bruta.empty:   # export do dia ainda sem apontamentos: não derruba a carga
+        log.warning("%s [%s]: fonte sem registros", arquivo, sheet or "csv")
+        return base_vazia()
+    with medir("limpeza"):
+        limpo = limpar_base(bruta, regras)
+    with medir("compactacao"):
+        base = compactar(limpo)
+    if log.isEnabledFor(logging.INFO):
+        mem = relatorio_memoria(limpo, base).loc["TOTAL"]
+        log.info("%s [%s]: %d registros, %.1f MB → %.1f MB em memória",
+                 arquivo, sheet or "csv", len(base), mem["antes"] / 2**20, mem["depois"] / 2**20)
+    return base
+
+# ===================== SNAPSHOT =====================
+def _hash_arquivo(arquivo, bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(arquivo, "rb") as f:
+        for chunk in iter(lambda: f.read(bloco), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _formato_snapshot():
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return "pickle"
+
+def _caminhos(arquivo, sheet, snapshot_dir):
+    # hash do caminho: mesmo nome de arquivo em pastas diferentes (uma por fazenda)
+    h = hashlib.sha1(os.path.abspath(arquivo).encode("utf-8")).hexdigest()[:8]
+    base = f"{os.path.splitext(os.path.basename(arquivo))[0]}__{sheet or 'csv'}__{h}"
+    return os.path.join(snapshot_dir, base + ".json"), os.path.join(snapshot_dir, base)
+
+def _ler_manifesto(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _escrever_atomico(caminho, escrever):
+    """Grava em arquivo temporário e troca com os.replace (seguro com vários workers)."""
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        escrever(tmp)
+        os.replace(tmp, caminho)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _salvar_snapshot(df, destino):
+    fmt = _formato_snapshot()
+    if fmt == "parquet":
+        try:
+            _escrever_atomico(destino + ".parquet", lambda p: df.to_parquet(p, index=False))
+            return "parquet", destino + ".parquet"
+        except Exception as e:  # colunas mistas etc. → cai para pickle
+            log.warning("snapshot parquet falhou (%s); usando pickle", e)
+    _escrever_atomico(destino + ".pkl", lambda p: df.to_pickle(p))
+    return "pickle", destino + ".pkl"
+
+def _ler_snapshot(fmt, caminho):
+    if fmt == "parquet":
+        return pd.read_parquet(caminho)
+    return pd.read_pickle(caminho)
+
+def _gravar_manifesto(caminho, man):
+    def escrever(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(man, f, indent=2)
+    _escrever_atomico(caminho, escrever)
+
+def _snapshot_valido(arquivo, sheet, snapshot_dir):
+    """Base do snapshot se ele ainda vale para o arquivo; senão None."""
+    st = os.stat(arquivo)
+    manifesto_path, destino = _caminhos(arquivo, sheet, snapshot_dir)
+    man = _ler_manifesto(manifesto_path)
+    regras_sha = regras_atuais()[1]
+    valido = (man is not None and man.get("versao") == VERSAO_SNAPSHOT
+              and man.get("regras") == regras_sha
+              and os.path.exists(man.get("snapshot", "")))
+
+    sha = None
+    if valido and (man["size"], man["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+        sha = _hash_arquivo(arquivo)
+        valido = sha == man["sha256"]
+
+    if valido:
+        try:
+            df = _ler_snapshot(man["formato"], man["snapshot"])
+        except Exception as e:
+            log.warning("snapshot ilegível (%s); relendo %s", e, arquivo)
+        else:
+            if (man["size"], man["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+                man.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                try:
+                    _gravar_manifesto(manifesto_path, man)
+                except OSError as e:
+                    log.warning("não foi possível atualizar manifesto: %s", e)
+            return df
+    return None
+
+def _ler_e_salvar(arquivo, sheet, snapshot_dir):
+    """
+    Relê a fonte e regrava snapshot + manifesto (roda nos processos da ingestão).
+    Hash antes da leitura e stat de novo depois: se o arquivo foi regravado no
+    meio (export chegando), as linhas lidas não casam com tamanho/mtime/sha →
+    não grava snapshot (a próxima verificação vê a mudança e relê).
+    """
+    if not snapshot_dir:
+        return ler_planilha(arquivo, sheet)
+    st = os.stat(arquivo)
+    sha = _hash_arquivo(arquivo)
+    regras, regras_sha = regras_atuais()
+    df = ler_planilha(arquivo, sheet, regras=regras)
+    depois = os.stat(arquivo)
+    if (depois.st_size, depois.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+        log.warning("%s mudou durante a leitura; snapshot não gravado", arquivo)
+        return df
+    manifesto_path, destino = _caminhos(arquivo, sheet, snapshot_dir)
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        fmt, caminho = _salvar_snapshot(df, destino)
+        _gravar_manifesto(manifesto_path, {
+            "versao": VERSAO_SNAPSHOT, "regras": regras_sha, "arquivo": os.path.abspath(arquivo), "sheet": sheet,
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "sha256": sha,
+            "formato": fmt, "snapshot": caminho,
+        })
+    except OSError as e:  # sem permissão de escrita etc. → segue sem cache
+        log.warning("não foi possível gravar snapshot: %s", e)
+    return df
+
+def _ler_e_salvar_medido(arquivo, sheet, snapshot_dir):
+    """_ler_e_salvar no filho do pool + as medições dele (o pai soma; o filho não expõe /metrics)."""
+    zerar()
+    return _ler_e_salvar(arquivo, sheet, snapshot_dir), estado()
+
+def carregar_base(arquivo, sheet, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Base limpa com cache em disco.
+    Chave do snapshot: tamanho + mtime + sha256 da fonte (+ VERSAO_SNAPSHOT e hash das regras).
+    - tamanho/mtime iguais → lê o snapshot direto (sem hash);
+    - mudaram mas o hash é o mesmo (arquivo copiado/tocado) → reaproveita e atualiza o manifesto;
+    - senão → relê a fonte e regrava o snapshot.
+    """
+    df = _snapshot_valido(arquivo, sheet, snapshot_dir) if snapshot_dir else None
+    return df if df is not None else _ler_e_salvar(arquivo, sheet, snapshot_dir)
+
+def carregar_fontes(fontes, snapshot_dir=SNAPSHOT_DIR, processos=PROCESSOS_INGESTAO):
+    """
+    [(arquivo, sheet)] → [base limpa] na mesma ordem.
+    Snapshots válidos são lidos aqui; o resto é lido num pool de processos.
+    fork (não spawn): spawn reimportaria o módulo principal (app.py → carga de novo);
+    os filhos só rodam a leitura/limpeza desta função. Só use processos > 1 num
+    processo com uma thread (a carga inicial); a recarga em segundo plano lê em sequência.
+    """
+    out = [_snapshot_valido(a, s, snapshot_dir) if snapshot_dir else None for a, s in fontes]
+    faltam = [i for i, d in enumerate(out) if d is None]
+    if len(faltam) > 1 and processos > 1:
+        ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(min(processos, len(faltam)), mp_context=ctx) as pool:
+            futuros = {i: pool.submit(_ler_e_salvar_medido, *fontes[i], snapshot_dir) for i in faltam}
+            for i, f in futuros.items():
+                out[i], medicoes = f.result()
+                incorporar(medicoes)
+    else:
+        for i in faltam:
+            out[i] = _ler_e_salvar(*fontes[i], snapshot_dir)
+    return out
+
+def versao_base(arquivo, sheet, snapshot_dir=SNAPSHOT_DIR):
+    """Identificador curto da base (muda quando o xlsx ou as regras mudam) → chave de cache."""
+    man = _ler_manifesto(_caminhos(arquivo, sheet, snapshot_dir)[0]) if snapshot_dir else None
+    if man and man.get("versao") == VERSAO_SNAPSHOT:
+        return f"{man['sha256'][:12]}-{man['regras'][:6]}-v{VERSAO_SNAPSHOT}"
+    st = os.stat(arquivo)
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}-v{VERSAO_SNAPSHOT}"
@@ -0,0 +1,262 @@
+"""
+Métricas do servidor no formato texto do Prometheus (rota /metrics em app.py),
+sem dependência nova: histogramas de tempo e bytes dos callbacks do Dash e das
+etapas da ingestão, mais um perfil por amostragem das requisições lentas.
+
+Com vários workers (gunicorn), cada processo grava o seu estado em
+TIMELINE_METRICAS_DIR/<pid>-<início>.json e o /metrics soma todos — qualquer worker
+que atender o scrape devolve o total. Sem a pasta, cada processo expõe só o seu.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+log = logging.getLogger(__name__)
+
+# ===================== PARÂMETROS =====================
+# TIMELINE_METRICAS: "0" desliga a instrumentação dos callbacks e a rota /metrics
+# TIMELINE_METRICAS_DIR: pasta compartilhada pelos workers (gunicorn.conf.py define)
+# TIMELINE_PERFIL_LENTO_MS: requisição acima de N ms grava o perfil amostrado; 0 = desligado
+ATIVAS            = os.environ.get("TIMELINE_METRICAS", "1") != "0"
+PASTA_METRICAS    = os.environ.get("TIMELINE_METRICAS_DIR") or None
+GRAVAR_A_CADA_S   = 5.0
+PERFIL_LENTO_MS   = float(os.environ.get("TIMELINE_PERFIL_LENTO_MS", "0"))
+PERFIL_DIR        = os.environ.get("TIMELINE_PERFIL_DIR", "perfis")
+PERFIL_INTERVALO_MS = float(os.environ.get("TIMELINE_PERFIL_INTERVALO_MS", "5"))
+
+LIMITES_SEGUNDOS  = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_INGESTAO  = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LIMITES_BYTES     = tuple(256 * 4 ** i for i in range(10))   # 256 B … 64 MB
+
+# ===================== HISTOGRAMAS =====================
+# Série = valores dos rótulos → [contagem por faixa (não acumulada)..., soma, total].
+_lock = threading.Lock()
+_registro = {}
+
+class Histograma:
+    def __init__(self, nome, ajuda, rotulos, limites):
+        self.nome, self.ajuda, self.rotulos, self.limites = nome, ajuda, tuple(rotulos), tuple(limites)
+        self.series = {}
+        _registro[nome] = self
+
+    def observar(self, valor, *rotulos):
+        with _lock:
+            s = self.series.get(rotulos)
+            if s is None:
+                s = self.series[rotulos] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            s[bisect.bisect_left(self.limites, valor)] += 1
+            s[-2] += valor; s[-1] += 1
+
+CALLBACK_SEGUNDOS = Histograma("timeline_callback_segundos",
+                               "Requisição do callback do Dash, do corpo recebido à resposta pronta.",
+                               ["callback", "gatilho"], LIMITES_SEGUNDOS)
+CALLBACK_FUNCAO_SEGUNDOS = Histograma("timeline_callback_funcao_segundos",
+                                      "Só a função do callback (sem leitura do corpo nem serialização da resposta).",
+                                      ["callback"], LIMITES_SEGUNDOS)
+CALLBACK_BYTES = Histograma("timeline_callback_bytes", "Tamanho do corpo da requisição/resposta do callback.",
+                            ["callback", "direcao"], LIMITES_BYTES)
+INGESTAO_SEGUNDOS = Histograma("timeline_ingestao_segundos", "Etapas da carga/recarga da base.",
+                               ["etapa"], LIMITES_INGESTAO)
+
+@contextmanager
+def medir(etapa):
+    """with medir("limpeza"): ... → INGESTAO_SEGUNDOS{etapa}."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        INGESTAO_SEGUNDOS.observar(time.perf_counter() - inicio, etapa)
+
+_funcao = threading.local()
+
+def cronometrado(func):
+    """Decorador das funções de callback: guarda o tempo da chamada para o hook da requisição (tempo_funcao)."""
+    @wraps(func)
+    def chamar(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _funcao.segundos = time.perf_counter() - inicio
+    return chamar
+
+def tempo_funcao():
+    """Tempo da última função cronometrada nesta thread (None se não houve) e zera."""
+    s, _funcao.segundos = getattr(_funcao, "segundos", None), None
+    return s
+
+# ===================== ESTADO ENTRE PROCESSOS =====================
+def estado():
+    """{nome: [[rótulos, série], ...]} — serializável em JSON/pickle."""
+    with _lock:
+        return {h.nome: [[list(r), list(s)] for r, s in h.series.items()] for h in _registro.values()}
+
+def incorporar(est):
+    """Soma um estado (de outro processo) ao registro deste."""
+    with _lock:
+        for nome, series in est.items():
+            h = _registro.get(nome)
+            if h is None:
+                continue
+            for r, s in series:
+                atual = h.series.get(tuple(r))
+                h.series[tuple(r)] = s if atual is None else [a + b for a, b in zip(atual, s)]
+
+def zerar():
+    with _lock:
+        for h in _registro.values():
+            h.series = {}
+
+_gravado_em = 0.0
+
+def _id_processo():
+    # pid sozinho não basta: worker novo pode herdar o pid de um que morreu e
+    # sobrescrever os totais dele (contador caindo = reset para o Prometheus)
+    return f"{os.getpid()}-{time.time_ns()}"
+
+_arquivo_proprio = f"{_id_processo()}.json"
+
+def persistir(forcar=False, pasta=None):
+    """Grava o estado deste processo em <pasta>/<pid>-<início>.json (no máximo a cada GRAVAR_A_CADA_S)."""
+    global _gravado_em
+    pasta = pasta or PASTA_METRICAS
+    if not pasta or (not forcar and time.monotonic() - _gravado_em < GRAVAR_A_CADA_S):
+        return
+    _gravado_em = time.monotonic()
+    caminho = os.path.join(pasta, _arquivo_proprio)
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(estado(), f)
+        os.replace(caminho + ".tmp", caminho)
+    except OSError as e:
+        log.warning("métricas: não foi possível gravar %s (%s)", caminho, e)
+
+def _somar_processos(pasta):
+    """Estado deste processo + os arquivos dos outros (inclusive workers que já morreram: contadores só sobem)."""
+    total = {nome: {tuple(r): s for r, s in series} for nome, series in estado().items()}
+    for arq in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []:
+        if not arq.endswith(".json") or arq == _arquivo_proprio:
+            continue
+        try:
+            with open(os.path.join(pasta, arq), encoding="utf-8") as f:
+                outro = json.load(f)
+        except (OSError, ValueError):
+            continue   # worker gravando agora → entra no próximo scrape
+        for nome, series in outro.items():
+            if nome not in total:
+                continue
+            for r, s in series:
+                atual = total[nome].get(tuple(r))
+                total[nome][tuple(r)] = s if atual is None else [a + b for a, b in zip(atual, s)]
+    return total
+
+# Fork: o pai grava antes (o filho não repete as medições herdadas, p.ex. a carga
+# feita no master do gunicorn); sem pasta, o filho fica com a cópia herdada.
+def _antes_do_fork():
+    if PASTA_METRICAS:
+        persistir(forcar=True)
+
+def _no_filho():
+    global _lock, _gravado_em, _arquivo_proprio
+    _lock = threading.Lock()   # outra thread podia estar com ele na hora do fork
+    _gravado_em = 0.0
+    _arquivo_proprio = f"{_id_processo()}.json"
+    if PASTA_METRICAS:
+        zerar()
+
+os.register_at_fork(before=_antes_do_fork, after_in_child=_no_filho)
+
+# ===================== FORMATO PROMETHEUS =====================
+def _escapar(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _rotulos(nomes, valores, le=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if le is not None:
+        pares.append(f'le="{le}"')
+    return "{" + ",".join(pares) + "}"
+
+def _num(v):
+    return repr(float(v))
+
+def texto_prometheus(pasta=None):
+    """Exposição em texto (versão 0.0.4) de todos os histogramas, somando os processos se houver pasta."""
+    pasta = pasta or PASTA_METRICAS
+    if pasta:
+        persistir(forcar=True, pasta=pasta)
+        series = _somar_processos(pasta)
+    else:
+        series = {nome: {tuple(r): s for r, s in ss} for nome, ss in estado().items()}
+    linhas = []
+    for h in _registro.values():
+        linhas += [f"# HELP {h.nome} {h.ajuda}", f"# TYPE {h.nome} histogram"]
+        for r, s in sorted(series.get(h.nome, {}).items()):
+            acum = 0
+            for limite, n in zip(h.limites, s):
+                acum += n
+                linhas.append(f"{h.nome}_bucket{_rotulos(h.rotulos, r, _num(limite))} {acum}")
+            linhas.append(f"{h.nome}_bucket{_rotulos(h.rotulos, r, '+Inf')} {s[-1]}")
+            linhas.append(f"{h.nome}_sum{_rotulos(h.rotulos, r)} {_num(s[-2])}")
+            linhas.append(f"{h.nome}_count{_rotulos(h.rotulos, r)} {s[-1]}")
+    return "\n".join(linhas) + "\n"
+
+# ===================== PERFIL DAS REQUISIÇÕES LENTAS =====================
+# Uma thread por processo copia a pilha das threads em atendimento a cada
+# PERFIL_INTERVALO_MS (sys._current_frames; não instrumenta as funções, então o
+# custo não depende do código medido). Se a requisição passou de PERFIL_LENTO_MS,
+# as amostras vão para PERFIL_DIR em "pilhas dobradas" (uma linha "a;b;c N"),
+# que flamegraph.pl e speedscope abrem direto.
+def _pilha(frame):
+    nomes = []
+    while frame is not None:
+        nomes.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(nomes))
+
+class Amostrador:
+    def __init__(self, intervalo_ms=PERFIL_INTERVALO_MS):
+        self.intervalo_s = intervalo_ms / 1000
+        self._amostras = {}   # id da thread → Counter de pilhas
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def iniciar(self, tid):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid, self._amostras = os.getpid(), {}
+                    threading.Thread(target=self._laco, name="perfil-amostrador", daemon=True).start()
+        self._amostras[tid] = Counter()
+
+    def parar(self, tid):
+        return self._amostras.pop(tid, None) or Counter()
+
+    def _laco(self):
+        while True:
+            time.sleep(self.intervalo_s)
+            frames = sys._current_frames()
+            for tid, pilhas in list(self._amostras.items()):
+                f = frames.get(tid)
+                if f is not None:
+                    pilhas[_pilha(f)] += 1
+
+def gravar_perfil(pilhas, nome, segundos, pasta=PERFIL_DIR):
+    """Pilhas dobradas em <pasta>/<data-hora>-<nome>-<ms>ms-<pid>.txt; devolve o caminho."""
+    seguro = "".join(c if c.isalnum() or c in "-_." else "_" for c in nome)[:80] or "requisicao"
+    caminho = os.path.join(pasta, f"{time.strftime('%Y%m%d-%H%M%S')}-{seguro}-{segundos * 1000:.0f}ms-{os.getpid()}.txt")
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.writelines(f"{p} {n}\n" for p, n in pilhas.most_common())
+    except OSError as e:
+        log.warning("perfil: não foi possível gravar %s (%s)", caminho, e)
+        return None
+    return caminho
@@ -0,0 +1,140 @@
+"""
+Relatório em lote dos indicadores do dashboard, por operador e dia (sem abrir a tela).
+
+    python relatorio.py [--arquivo "Linha do tempo.xlsx"] [--sheet Plan1] [--gap 2]
+                        [--de 2025-03-01] [--ate 2025-03-31] [--saida relatorios]
+                        [--formato parquet|xlsx|ambos] [--processos N]
+
+Para cada operador e cada dia em que ele tem segmentos, totaliza a janela
+[dia 00:00, dia+1 00:00) com todas as máquinas — a mesma janela do dashboard
+ao escolher o dia, mas todos os dias de uma vez (consulta_por_dia) — e grava:
+- indicadores: início/fim da batelada e horas (total, Efetivo, Gerenciável, Mecânica), como nos cards;
+- improdutivas: minutos e ocorrências por tipo × operação, como na tabela.
+As contas são as de segmentos.py (indicadores_janela / improdutivas_janela),
+então os números batem com a tela. Os operadores são divididos entre N
+processos (fork: a base carregada uma vez é herdada, nada é serializado na ida).
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from dados import carregar_dados, padroes_padrao, preparar_operador
+from exportacao import LINHAS_POR_ABA_XLSX
+from ingestao import PROCESSOS_INGESTAO, SNAPSHOT_DIR
+from segmentos import GAP_MAX_MIN, consulta_por_dia, filtrar_janela, improdutivas_janela, indicadores_janela
+
+log = logging.getLogger(__name__)
+
+# ===================== PARÂMETROS =====================
+COLUNAS_INDICADORES = ["Operador","Dia","Início da batelada","Fim da batelada",
+                       "Total (h)","Efetivo (h)","Gerenciável (h)","Mecânica (h)"]
+COLUNAS_IMPRODUTIVAS = ["Operador","Dia","Tipo","Apontamento","Minutos","Ocorrências"]
+LOTES_POR_PROCESSO = 4            # operadores em lotes menores que N → balanceia operadores grandes
+
+# ===================== CÁLCULO =====================
+_DADOS = None   # base carregada no processo pai; os filhos (fork) herdam
+
+def kpis_operador(dados, operador, de=None, ate=None):
+    """(indicadores, improdutivas) de um operador, uma linha de indicadores por dia com atividade."""
+    prep = preparar_operador(dados, operador)
+    if prep is None:
+        return pd.DataFrame(columns=COLUNAS_INDICADORES), pd.DataFrame(columns=COLUNAS_IMPRODUTIVAS)
+    win = filtrar_janela(consulta_por_dia(prep["dff"]), prep["equip_all"])
+    if de:
+        win = win[win["Dia"] >= pd.Timestamp(de).normalize()]
+    if ate:
+        win = win[win["Dia"] <= pd.Timestamp(ate).normalize()]
+    ind = indicadores_janela(win, ["Dia"]).rename(columns=dict(zip(
+        ["Inicio","Fim","Total h","Efetivo h","Gerenciável h","Mecânica h"], COLUNAS_INDICADORES[2:])))
+    imp = improdutivas_janela(win, ["Dia"])
+    for t in (ind, imp):
+        t.insert(0, "Operador", operador)
+        t["Dia"] = t["Dia"].dt.date
+    return ind[COLUNAS_INDICADORES], imp[COLUNAS_IMPRODUTIVAS]
+
+def _lote(args):
+    """Roda no processo filho: ([operadores], de, ate) → [(indicadores, improdutivas)]."""
+    operadores, de, ate = args
+    return [kpis_operador(_DADOS, operador, de, ate) for operador in operadores]
+
+def calcular(dados, de=None, ate=None, processos=PROCESSOS_INGESTAO):
+    """Base → (DataFrame de indicadores, DataFrame de improdutivas), ordenados por operador e dia."""
+    global _DADOS
+    operadores = list(dados.nomes)
+    n_lotes = max(1, min(len(operadores), processos * LOTES_POR_PROCESSO))
+    lotes = [(operadores[i::n_lotes], de, ate) for i in range(n_lotes)]
+    _DADOS = dados
+    try:
+        if processos > 1 and len(lotes) > 1:
+            ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+            with ProcessPoolExecutor(min(processos, len(lotes)), mp_context=ctx) as pool:
+                partes = [p for r in pool.map(_lote, lotes) for p in r]
+        else:
+            partes = [p for lote in lotes for p in _lote(lote)]
+    finally:
+        _DADOS = None
+    # lotes intercalados → volta à ordem (operador, dia); dentro do dia mantém a ordem da tabela
+    tabelas = []
+    for i, colunas in enumerate([COLUNAS_INDICADORES, COLUNAS_IMPRODUTIVAS]):
+        t = [p[i] for p in partes if len(p[i])]
+        t = pd.concat(t, ignore_index=True) if t else pd.DataFrame(columns=colunas)
+        tabelas.append(t.sort_values(["Operador","Dia"], kind="stable").reset_index(drop=True))
+    return tuple(tabelas)
+
+# ===================== SAÍDA =====================
+def gravar_parquet(tabelas, pasta):
+    caminhos = []
+    for nome, df in tabelas.items():
+        caminhos.append(os.path.join(pasta, f"{nome}.parquet"))
+        df.to_parquet(caminhos[-1], index=False)
+    return caminhos
+
+def gravar_xlsx(tabelas, pasta):
+    caminho = os.path.join(pasta, "indicadores.xlsx")
+    with pd.ExcelWriter(caminho, engine="openpyxl") as w:
+        for nome, df in tabelas.items():
+            for n, ini in enumerate(range(0, max(len(df), 1), LINHAS_POR_ABA_XLSX)):
+                aba = nome if n == 0 else f"{nome}_{n + 1}"
+                df.iloc[ini:ini + LINHAS_POR_ABA_XLSX].to_excel(w, sheet_name=aba, index=False)
+    return [caminho]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--arquivo", default="Linha do tempo.xlsx")
+    ap.add_argument("--sheet", default="Plan1")
+    ap.add_argument("--gap", type=int, default=GAP_MAX_MIN, help="gap de agrupamento (min); padrão: TIMELINE_GAP_MIN, o mesmo do app")
+    ap.add_argument("--de", help="primeiro dia (AAAA-MM-DD)")
+    ap.add_argument("--ate", help="último dia (AAAA-MM-DD)")
+    ap.add_argument("--saida", default="relatorios", help="pasta de saída")
+    ap.add_argument("--formato", choices=["parquet","xlsx","ambos"], default="parquet")
+    ap.add_argument("--processos", type=int, default=PROCESSOS_INGESTAO)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    inicio = time.perf_counter()
+    dados = carregar_dados(padroes_padrao(args.arquivo), args.sheet, args.gap, SNAPSHOT_DIR, args.processos)
+    log.info("base %s: %d registros, %d segmentos, %d operadores (%.1fs)", dados.versao, len(dados.df),
+             len(dados.segmentos), len(dados.nomes), time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    indicadores, improdutivas = calcular(dados, args.de, args.ate, args.processos)
+    log.info("%d operador-dias, %d linhas de improdutivas (%.1fs, %d processos)",
+             len(indicadores), len(improdutivas), time.perf_counter() - inicio, args.processos)
+
+    os.makedirs(args.saida, exist_ok=True)
+    tabelas = {"indicadores": indicadores, "improdutivas": improdutivas}
+    caminhos = []
+    if args.formato in ("parquet", "ambos"):
+        caminhos += gravar_parquet(tabelas, args.saida)
+    if args.formato in ("xlsx", "ambos"):
+        caminhos += gravar_xlsx(tabelas, args.saida)
+    for c in caminhos:
+        log.info("gravado %s", c)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import os
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from ingestao import concatenar
+
+# ===================== PARÂMETROS =====================
+# TIMELINE_GAP_MIN: tolerância (min) para juntar apontamentos contíguos — a mesma
+# para o app, o relatório e o gerador do bench (todos importam daqui)
+GAP_MAX_MIN = int(os.environ.get("TIMELINE_GAP_MIN", "2"))
+
+COLUNAS_SEGMENTO = ["Nome","Inicio","Fim","Descrição da Operação","Duracao Min","Tipo Parada","Equipamento"]
+
+# ===================== UTILIDADES =====================
+def normalize_ascii_upper(s: str) -> str:
+    return unicodedata.normalize("NFKD", str(s)).encode("ASCII","ignore").decode("ASCII").upper()
+
+def eh_fim_de_expediente(txt: str) -> bool:
+    t = normalize_ascii_upper(txt)
+    return ("EXPEDIENTE" in t) and (("FIM" in t) or ("FINAL" in t))
+
+# ===================== AGRUPAMENTO =====================
+def agrupar_paradas(df_filtrado, gap_max_min=GAP_MAX_MIN):
+    """
+    Colapsa blocos contíguos da MESMA operação, MESMO equipamento e MESMO operador (gap <= gap_max_min).
+    Aceita vários operadores de uma vez (ordena por Nome, Inicio).
+    Retorna: Nome, Inicio, Fim, Descrição da Operação, Duracao Min, Tipo Parada, Equipamento.
+
+    Passo único vetorizado:
+    - "chave" = (Nome, operação, equipamento); muda a chave → novo bloco;
+    - dentro da chave, quebra quando Inicio - max(Fim anteriores) > gap.
+      O máximo acumulado pode ser tomado desde o início da chave: blocos
+      anteriores da mesma chave terminam antes do Inicio atual - gap.
+    """
+    if df_filtrado.empty:
+        return pd.DataFrame(columns=COLUNAS_SEGMENTO)
+    d = (df_filtrado[["Nome","Inicio","Fim","Descrição da Operação","Tipo Parada","Equipamento"]]
+         .sort_values(["Nome","Inicio"], kind="stable").reset_index(drop=True))
+
+    chaves = d[["Nome","Descrição da Operação","Equipamento"]]
+    # NaN != NaN → operação/equipamento ausente nunca emenda (igual ao loop antigo)
+    nova_chave = (chaves != chaves.shift()).any(axis=1)
+    chave_id = nova_chave.cumsum()
+
+    fim_ant = d["Fim"].groupby(chave_id).cummax().groupby(chave_id).shift()
+    quebra = nova_chave | ((d["Inicio"] - fim_ant) > pd.Timedelta(minutes=gap_max_min))
+    bloco = quebra.cumsum()
+
+    g = d.groupby(bloco, sort=False)
+    out = g[["Nome","Inicio","Descrição da Operação","Tipo Parada","Equipamento"]].first()
+    out["Fim"] = g["Fim"].max()
+    out["Duracao Min"] = ((out["Fim"] - out["Inicio"]).dt.total_seconds() / 60.0).clip(lower=0.0)
+    return out[COLUNAS_SEGMENTO].reset_index(drop=True)
+
+def montar_segmentos(df, gap_max_min=GAP_MAX_MIN):
+    """Agrupado de TODOS os operadores, já sem "fim/final de expediente" (roda uma vez na carga)."""
+    seg = agrupar_paradas(df, gap_max_min)
+    ops = seg["Descrição da Operação"].dropna().unique()
+    fim_exp = [op for op in ops if eh_fim_de_expediente(op)]
+    return seg[~seg["Descrição da Operação"].isin(fim_exp)].reset_index(drop=True)
+
+def anexar_segmentos(segmentos, df, novos, gap_max_min=GAP_MAX_MIN):
+    """
+    Atualiza o agrupado quando a base só ganhou registros (df = base inteira já
+    com os novos; novos = só os registros acrescentados), sem re-agrupar o histórico.
+    Por operador com registros novos, o corte é o último segmento que começa
+    até o 1º Inicio novo: antes dele nada muda (o agrupamento é sequencial e os
+    novos vêm depois na ordem); dali em diante re-agrupa. Se outro registro
+    começa no mesmo instante do corte, recua um segmento (empates de Inicio
+    podem pertencer ao bloco anterior). Resultado igual a montar_segmentos(df).
+    """
+    if novos.empty:
+        return segmentos
+    t_novo = novos.dropna(subset=["Nome"]).groupby("Nome", observed=True)["Inicio"].min()
+    seg_ini = segmentos[segmentos["Nome"].isin(t_novo.index)].groupby("Nome", observed=True)["Inicio"].agg(list)
+    linhas = df[df["Nome"].isin(t_novo.index)]
+    n_no_instante = linhas.groupby(["Nome","Inicio"], observed=True).size()
+
+    cortes = {}
+    for nome, t in t_novo.items():
+        inis = seg_ini.get(nome, [])
+        i = int(np.searchsorted(inis, t, "right")) - 1
+        while i >= 0 and n_no_instante.get((nome, inis[i]), 0) > 1:
+            i -= 1
+        cortes[nome] = inis[i] if i >= 0 else pd.NaT
+
+    # corte NaT (nenhum segmento antes) → re-agrupa o operador inteiro
+    corte = pd.to_datetime(segmentos["Nome"].map(cortes))
+    manter = segmentos[~segmentos["Nome"].isin(cortes.keys()) | (segmentos["Inicio"] < corte)]
+    refazer = linhas[~(linhas["Inicio"] < pd.to_datetime(linhas["Nome"].map(cortes)))]
+    out = concatenar([manter, montar_segmentos(refazer, gap_max_min)])
+    return out.sort_values(["Nome","Inicio"], kind="stable").reset_index(drop=True)
+
+# ===================== ÍNDICE DE JANELA =====================
+US_POR_MIN = 60_000_000
+US_POR_HORA = 60 * US_POR_MIN
+COLUNAS_CATEGORIA = ["Equipamento","Tipo Parada","Descrição da Operação"]
+
+def para_us(t):
+    """Timestamp/array de datetimes → int64 em µs desde epoch."""
+    return np.asarray(t, dtype="datetime64[us]").astype("int64")
+
+class IndiceJanela:
+    """
+    Índice de intervalos de UM operador para totais numa janela [x0, x1).
+    - segmentos (duração > 0) ordenados por Inicio, instantes em µs inteiros;
+    - máximo acumulado de Fim → primeiro segmento que ainda pode cruzar x0;
+    - maior duração → segmentos que podem passar de x1;
+    - por categoria (Equipamento, Tipo Parada, Operação): posições + durações
+      acumuladas, então o total de uma faixa sai de duas buscas binárias.
+    Só os segmentos das bordas são recortados um a um.
+    """
+    def __init__(self, dff):
+        d = dff[dff["Fim"] > dff["Inicio"]].sort_values("Inicio", kind="stable")
+        self.ini = para_us(d["Inicio"].to_numpy())
+        self.fim = para_us(d["Fim"].to_numpy())
+        self.max_fim = np.maximum.accumulate(self.fim) if len(d) else self.fim
+        self.dur_max = int((self.fim - self.ini).max()) if len(d) else 0
+
+        grupos = d.groupby(COLUNAS_CATEGORIA, sort=False, dropna=False, observed=True)
+        self.cod = grupos.ngroup().to_numpy()
+        self.categorias = d[COLUNAS_CATEGORIA].drop_duplicates().reset_index(drop=True)
+
+        # chave = categoria * n + posição → blocos contíguos por categoria, em ordem de Inicio
+        n = len(d); self.n = n
+        pos = np.arange(n)
+        ordem = np.lexsort((pos, self.cod))
+        self.chaves = self.cod[ordem].astype("int64") * n + pos[ordem]
+        self.pos = pos[ordem]
+        self.acum = np.concatenate([[0], np.cumsum((self.fim - self.ini)[ordem])])
+        # máximo de Fim acumulado dentro de cada categoria
+        fim_ord = pd.Series(self.fim[ordem])
+        self.max_fim_cat = fim_ord.groupby(self.cod[ordem]).cummax().to_numpy()
+
+    @property
+    def nbytes(self):
+        """Bytes dos arrays + tabela de categorias (para o limite de memória do cache)."""
+        arrays = sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+        return int(arrays + self.categorias.memory_usage(index=True, deep=True).sum())
+
+    def consulta(self, x0, x1):
+        """
+        Totais por categoria dos segmentos recortados em [x0, x1).
+        Retorna DataFrame: Equipamento, Tipo Parada, Descrição da Operação,
+        Duracao Us (int, recortada), Ocorrências, Inicio/Fim (recortados).
+        """
+        x0 = int(para_us(pd.Timestamp(x0).to_datetime64())); x1 = int(para_us(pd.Timestamp(x1).to_datetime64()))
+        if self.n == 0:
+            return self._resultado(np.zeros(0, dtype=bool), [], [], [], [])
+        k = len(self.categorias)
+        hi = int(np.searchsorted(self.ini, x1, "left"))        # Inicio < x1
+        m  = min(int(np.searchsorted(self.ini, x0, "left")), hi)  # Inicio >= x0
+        lo = min(int(np.searchsorted(self.max_fim, x0, "right")), m)  # antes disso, Fim <= x0
+
+        # miolo [m, hi): Inicio dentro da janela → conta duração inteira
+        base = np.arange(k, dtype="int64") * self.n
+        a = np.searchsorted(self.chaves, base + m); b = np.searchsorted(self.chaves, base + hi)
+        dur = self.acum[b] - self.acum[a]
+        ocorr = b - a
+        tem = b > a
+        ini_cat = np.where(tem, self.ini[self.pos[np.minimum(a, self.n - 1)]], np.iinfo("int64").max)
+        fim_cat = np.where(tem, np.minimum(self.max_fim_cat[np.maximum(b - 1, 0)], x1), np.iinfo("int64").min)
+
+        # borda direita: começa dentro mas termina depois de x1 → desconta o excesso
+        r0 = max(m, int(np.searchsorted(self.ini, x1 - self.dur_max, "left")))
+        idx = np.arange(r0, hi)
+        idx = idx[self.fim[idx] > x1]
+        np.add.at(dur, self.cod[idx], x1 - self.fim[idx])
+
+        # borda esquerda: começa antes de x0 e ainda está ativo
+        idx = np.arange(lo, m)
+        corte = np.minimum(self.fim[idx], x1) - x0
+        ok = corte > 0
+        idx, corte = idx[ok], corte[ok]
+        np.add.at(dur, self.cod[idx], corte)
+        np.add.at(ocorr, self.cod[idx], 1)
+        np.minimum.at(ini_cat, self.cod[idx], x0)
+        np.maximum.at(fim_cat, self.cod[idx], x0 + corte)
+
+        return self._resultado(ocorr > 0, dur, ocorr, ini_cat, fim_cat)
+
+    def _resultado(self, sel, dur, ocorr, ini_cat, fim_cat):
+        out = self.categorias[sel].reset_index(drop=True)
+        out["Duracao Us"]  = np.asarray(dur, dtype="int64")[sel]
+        out["Ocorrências"] = np.asarray(ocorr, dtype="int64")[sel]
+        out["Inicio"] = np.asarray(ini_cat, dtype="int64")[sel].astype("datetime64[us]")
+        out["Fim"]    = np.asarray(fim_cat, dtype="int64")[sel].astype("datetime64[us]")
+        return out
+
+# ===================== INDICADORES DA JANELA =====================
+# Contas dos cards e da tabela de improdutivas, a partir da consulta da janela
+# (IndiceJanela.consulta, ou consulta_por_dia para vários dias de uma vez).
+# Usadas pelo dashboard (app.py) e pelo relatório em lote (relatorio.py) — os
+# dois dão os mesmos números.
+TIPOS_IMPRODUTIVOS = {"Parada Gerenciável": 1, "Parada Mecânica": 2, "Parada Essencial": 3, "Parada Improdutiva": 4}
+
+def filtrar_janela(win, equips):
+    """Só as máquinas em equips (apontamento sem equipamento fica de fora) + minutos recortados."""
+    win = win[win["Equipamento"].isin(equips)]
+    return win.assign(**{"Duracao Min Clip": win["Duracao Us"] / US_POR_MIN})
+
+CARDS_HORAS = {"Efetivo h": "Efetivo", "Gerenciável h": "Parada Gerenciável", "Mecânica h": "Parada Mecânica"}
+
+def indicadores_janela(win, por=()):
+    """
+    Cards: início/fim da batelada e horas (total, Efetivo, Gerenciável, Mecânica).
+    Sem `por` → dict da janela; com `por` (ex.: ["Dia"]) → DataFrame, uma linha
+    por grupo. Horas somadas em µs inteiros: não dependem da ordem das linhas.
+    """
+    us, tipo = win["Duracao Us"], win["Tipo Parada"]
+    if not por:
+        return {"Inicio": win["Inicio"].min(), "Fim": win["Fim"].max(), "Total h": us.sum() / US_POR_HORA,
+                **{c: us[tipo == t].sum() / US_POR_HORA for c, t in CARDS_HORAS.items()}}
+    por = list(por)
+    horas = ["Total h", *CARDS_HORAS]
+    t = win[por + ["Inicio","Fim"]].assign(**{"Total h": us}, **{c: us.where(tipo == t, 0) for c, t in CARDS_HORAS.items()})
+    out = t.groupby(por, sort=True, observed=True).agg({"Inicio": "min", "Fim": "max", **{c: "sum" for c in horas}})
+    out[horas] = out[horas] / US_POR_HORA
+    return out.reset_index()
+
+def tem_improdutivas(win):
+    return bool(win["Tipo Parada"].isin(TIPOS_IMPRODUTIVOS).any())
+
+def improdutivas_janela(win, por=()):
+    """Tabela: minutos (inteiros) e ocorrências por tipo improdutivo × operação, na ordem da tela (por grupo de `por`)."""
+    por = list(por)
+    win = win[win["Tipo Parada"].isin(TIPOS_IMPRODUTIVOS)]
+    resumo = (win.groupby(por + ["Tipo Parada","Descrição da Operação"], as_index=False, observed=True)
+                 .agg(Minutos=("Duracao Us","sum"),
+                      Ocorrências=("Ocorrências","sum")))
+    resumo["Minutos"] = (resumo["Minutos"] / US_POR_MIN).round(0).astype(int)
+    resumo["ord"] = resumo["Tipo Parada"].map(TIPOS_IMPRODUTIVOS).fillna(9)
+    resumo = resumo.sort_values(por + ["ord","Minutos"], ascending=[True] * len(por) + [True, False]).drop(columns=["ord"])
+    resumo = resumo.rename(columns={"Tipo Parada":"Tipo","Descrição da Operação":"Apontamento"})
+    return resumo[por + ["Tipo","Apontamento","Minutos","Ocorrências"]]
+
+# ===================== RESUMO DIÁRIO =====================
+US_POR_DIA = 86_400_000_000
+DIMENSOES_RESUMO = ["Nome","Equipamento"]
+
+def pedacos_por_dia(segmentos):
+    """
+    Cada segmento (duração > 0) dividido nos dias que toca. Retorna arrays
+    (linha posicional do segmento, dia em nº de dias desde 1970, início e fim
+    do pedaço em µs); Fim exatamente à meia-noite não abre pedaço no dia seguinte.
+    """
+    ini = para_us(segmentos["Inicio"].to_numpy()); fim = para_us(segmentos["Fim"].to_numpy())
+    seg = np.flatnonzero(fim > ini)
+    ini, fim = ini[seg], fim[seg]
+    d0 = ini // US_POR_DIA
+    n = (fim - 1) // US_POR_DIA - d0 + 1          # nº de dias tocados por segmento
+    pedaco = np.repeat(np.arange(len(seg)), n)
+    dia = d0[pedaco] + np.arange(len(pedaco)) - np.repeat(np.cumsum(n) - n, n)
+    a = np.maximum(ini[pedaco], dia * US_POR_DIA); b = np.minimum(fim[pedaco], (dia + 1) * US_POR_DIA)
+    return seg[pedaco], dia, a, b
+
+def consulta_por_dia(dff):
+    """
+    IndiceJanela(dff).consulta(D, D+1) de todos os dias D de uma vez: mesmas
+    colunas + "Dia", só dias com atividade. Por (dia, categoria): soma dos
+    pedaços, nº de pedaços, menor início e maior fim — o que a consulta de
+    cada dia devolve, sem montar uma janela por dia.
+    """
+    linhas, dia, a, b = pedacos_por_dia(dff)
+    p = dff[COLUNAS_CATEGORIA].iloc[linhas].reset_index(drop=True).assign(
+        Dia=(dia * US_POR_DIA).astype("datetime64[us]"), us=b - a, a=a, b=b)
+    out = (p.groupby(["Dia"] + COLUNAS_CATEGORIA, sort=True, dropna=False, observed=True)
+            .agg(**{"Duracao Us": ("us","sum"), "Ocorrências": ("us","size"), "Inicio": ("a","min"), "Fim": ("b","max")})
+            .reset_index())
+    out["Ocorrências"] = out["Ocorrências"].astype("int64")
+    out["Inicio"] = out["Inicio"].astype("datetime64[us]"); out["Fim"] = out["Fim"].astype("datetime64[us]")
+    return out
+
+def resumo_diario(segmentos):
+    """
+    Horas por dimensão (operador / equipamento) × dia × Tipo Parada, a partir do
+    agrupado. Segmento que cruza meia-noite é dividido: cada pedaço conta no seu
+    dia (Fim exatamente à meia-noite fica no dia anterior).
+    Retorna {dimensão: DataFrame[dimensão, Dia, Tipo Parada, Horas]} ordenado
+    por (dimensão, Dia, Tipo); montado na carga, a visão da frota só filtra.
+    """
+    if segmentos.empty:
+        return {dim: pd.DataFrame(columns=[dim, "Dia", "Tipo Parada", "Horas"]) for dim in DIMENSOES_RESUMO}
+    linhas, dia, a, b = pedacos_por_dia(segmentos)
+    us = b - a
+    base = pd.DataFrame({"Dia": (dia * US_POR_DIA).astype("datetime64[us]"),
+                         "Tipo Parada": segmentos["Tipo Parada"].iloc[linhas].reset_index(drop=True),
+                         "Horas": us / US_POR_HORA})
+    out = {}
+    for dim in DIMENSOES_RESUMO:
+        d = base.assign(**{dim: segmentos[dim].iloc[linhas].reset_index(drop=True)})
+        out[dim] = d.groupby([dim, "Dia", "Tipo Parada"], observed=True)["Horas"].sum().reset_index()
+    return out
+
+# ===================== NÍVEL DE DETALHE =====================
+def nivel_de_detalhe(dff, x0, x1, largura_px, margem=1.0):
+    """
+    Reduz os segmentos a desenhar para uma janela [x0, x1] num gráfico de largura_px.
+    - região fina = janela ± margem*largura da janela: 1 pixel = (x1-x0)/largura_px;
+    - fora dela: 1 pixel = período todo / largura_px;
+    - segmentos mais finos que 1 pixel viram UMA barra por balde de 1 pixel e
+      equipamento, com o tipo dominante (maior duração) do balde; os demais
+      seguem inteiros. Separar por equipamento mantém o filtro de máquinas
+      como simples visibilidade de traços.
+    Retorna as mesmas colunas do agrupado + "Agrupados" (nº de apontamentos na barra).
+    """
+    d = dff.reset_index(drop=True)
+    if d.empty:
+        return d.assign(Agrupados=pd.Series(dtype="int64"))
+    ini = para_us(d["Inicio"].to_numpy()); fim = para_us(d["Fim"].to_numpy())
+    x0 = int(para_us(pd.Timestamp(x0).to_datetime64())); x1 = int(para_us(pd.Timestamp(x1).to_datetime64()))
+    larg = max(x1 - x0, 1)
+    origem = int(ini.min())
+    px_fino  = max(larg // largura_px, 1)
+    px_geral = max((int(fim.max()) - origem) // largura_px, px_fino)
+
+    na_regiao = (fim > x0 - margem * larg) & (ini < x1 + margem * larg)
+    pixel = np.where(na_regiao, px_fino, px_geral)
+    # balde par = região fina, ímpar = visão geral; × equipamento
+    eq_cod, eq_uni = pd.factorize(d["Equipamento"], use_na_sentinel=False)
+    balde = (((ini - origem) // pixel) * 2 + (~na_regiao)) * max(len(eq_uni), 1) + eq_cod
+    fino = (fim - ini) < pixel
+
+    # balde com um único segmento fino → desenha o próprio segmento
+    n_balde = pd.Series(balde[fino]).value_counts()
+    fino &= pd.Series(balde).map(n_balde).fillna(0).to_numpy() > 1
+
+    inteiros = d[~fino].assign(Agrupados=1)
+    f = d[fino].assign(_balde=balde[fino], _dur=(fim - ini)[fino])
+    if f.empty:
+        return inteiros
+
+    por_tipo = f.groupby(["_balde","Tipo Parada"], sort=False, observed=True)["_dur"].sum()
+    dominante = por_tipo.groupby(level=0).idxmax().map(lambda t: t[1])
+    g = f.groupby("_balde", sort=False)
+    barras = pd.DataFrame({
+        "Nome": g["Nome"].first(),
+        "Inicio": g["Inicio"].min(),
+        "Fim": g["Fim"].max(),
+        "Duracao Min": g["Duracao Min"].sum(),
+        "Tipo Parada": dominante,
+        "Equipamento": g["Equipamento"].first(),
+        "Agrupados": g.size(),
+    })
+    barras["Descrição da Operação"] = barras["Agrupados"].astype(str) + " apontamentos (agrupados)"
+    out = pd.concat([inteiros, barras[inteiros.columns]], ignore_index=True)
+    return out.sort_values("Inicio", kind="stable").reset_index(drop=True)